@@ -8,6 +8,9 @@ import json
 # Carregar variáveis de ambiente do arquivo .env
 load_dotenv()
 
+# Diretório de dados da aplicação
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
 # Configurações da aplicação
 APP_TITLE = "💬 Chat"
 APP_ICON = "💬"
@@ -22,6 +25,84 @@ TYPING_MESSAGE = "Claude está digitando..."
 # Configurações do Claude CLI
 CLAUDE_PATH = os.getenv("CLAUDE_PATH", "claude")
 CLAUDE_TIMEOUT = int(os.getenv("CLAUDE_TIMEOUT", "90"))
+# Limites de espera (segundos, 0 desativa): até a primeira saída do modelo (texto ou
+# resultado; o registro de inicialização do CLI não conta) e sem nenhum dado novo
+# depois dela. CLAUDE_TIMEOUT é o prazo total da chamada.
+CLAUDE_FIRST_BYTE_TIMEOUT = int(os.getenv("CLAUDE_FIRST_BYTE_TIMEOUT", "30"))
+CLAUDE_IDLE_TIMEOUT = int(os.getenv("CLAUDE_IDLE_TIMEOUT", "60"))
+# Tamanho máximo (bytes) da saída de erro do CLI guardada por chamada (últimas linhas)
+CLAUDE_STDERR_MAX_BYTES = int(os.getenv("CLAUDE_STDERR_MAX_BYTES", "65536"))
+# Intervalo (s) entre amostras de CPU, memória e I/O do processo do CLI em /proc (0 desativa)
+CLAUDE_PROC_SAMPLE_INTERVAL = float(os.getenv("CLAUDE_PROC_SAMPLE_INTERVAL", "0.5"))
+# Prazo adaptativo (opcional): p95 das durações recentes (por tamanho do prompt e por
+# sessão) vezes a folga, entre o mínimo e o máximo; CLAUDE_TIMEOUT vale até haver medidas.
+# Substitui o prazo total, mas só até a primeira saída do modelo: depois dela, apenas
+# CLAUDE_IDLE_TIMEOUT interrompe a resposta. Cada estouro eleva o prazo da faixa
+CLAUDE_ADAPTIVE_TIMEOUT = json.loads(os.getenv("CLAUDE_ADAPTIVE_TIMEOUT", "false").lower())
+CLAUDE_TIMEOUT_MIN = int(os.getenv("CLAUDE_TIMEOUT_MIN", "20"))
+CLAUDE_TIMEOUT_MAX = int(os.getenv("CLAUDE_TIMEOUT_MAX", "300"))
+CLAUDE_TIMEOUT_HEADROOM = float(os.getenv("CLAUDE_TIMEOUT_HEADROOM", "2.0"))
+# Pedir fragmentos de texto parciais na saída stream-json (--include-partial-messages)
+CLAUDE_PARTIAL_MESSAGES = json.loads(os.getenv("CLAUDE_PARTIAL_MESSAGES", "true").lower())
+# Política de envio dos fragmentos em streaming: o que ocorrer primeiro (0 desativa o critério)
+CLAUDE_STREAM_FLUSH_MS = int(os.getenv("CLAUDE_STREAM_FLUSH_MS", "50"))
+CLAUDE_STREAM_FLUSH_BYTES = int(os.getenv("CLAUDE_STREAM_FLUSH_BYTES", "256"))
+
+# Pool de processos do Claude CLI pré-iniciados (0 desativa o pool). Desativado por
+# padrão: o CLI em modo -p desiste de esperar pela entrada padrão após ~3 s, então o
+# pool só ajuda em rajadas de chamadas de novas conversas (--resume depende do ID
+# da sessão). Um processo ocioso por CLAUDE_POOL_IDLE_TIMEOUT segundos (mantenha
+# abaixo dos ~3 s do CLI) é descartado e o slot só é reaquecido no próximo pedido
+CLAUDE_POOL_SIZE = int(os.getenv("CLAUDE_POOL_SIZE", "0"))
+CLAUDE_POOL_IDLE_TIMEOUT = float(os.getenv("CLAUDE_POOL_IDLE_TIMEOUT", "2"))
+CLAUDE_POOL_HEALTH_INTERVAL = int(os.getenv("CLAUDE_POOL_HEALTH_INTERVAL", "15"))
+
+# Cache de respostas em disco (opcional): tamanho máximo (LRU) e validade em segundos
+CLAUDE_CACHE_ENABLED = json.loads(os.getenv("CLAUDE_CACHE_ENABLED", "false").lower())
+CLAUDE_CACHE_PATH = os.getenv("CLAUDE_CACHE_PATH", os.path.join(DATA_DIR, "response_cache.sqlite3"))
+CLAUDE_CACHE_MAX_ENTRIES = int(os.getenv("CLAUDE_CACHE_MAX_ENTRIES", "1000"))
+CLAUDE_CACHE_TTL = int(os.getenv("CLAUDE_CACHE_TTL", "86400"))
+
+# Registro de uso (duração, turnos, tokens e custo) de cada chamada, por sessão
+CLAUDE_USAGE_ENABLED = json.loads(os.getenv("CLAUDE_USAGE_ENABLED", "true").lower())
+CLAUDE_USAGE_PATH = os.getenv("CLAUDE_USAGE_PATH", os.path.join(DATA_DIR, "usage.sqlite3"))
+
+# Controle de admissão: máximo de chamadas simultâneas ao Claude CLI (clientes
+# síncrono e assíncrono), quantas delas podem ser da fila "batch" e o tempo
+# máximo de espera na fila (segundos)
+CLAUDE_MAX_CONCURRENCY = int(os.getenv("CLAUDE_MAX_CONCURRENCY", "4"))
+CLAUDE_BATCH_MAX_CONCURRENCY = int(os.getenv("CLAUDE_BATCH_MAX_CONCURRENCY", "3"))
+CLAUDE_QUEUE_TIMEOUT = int(os.getenv("CLAUDE_QUEUE_TIMEOUT", "120"))
+
+# Orçamento de tokens (estimados) do prompt: o contexto da memória do usuário
+# é reduzido aos itens mais relevantes para caber nele (0 desativa o limite)
+CLAUDE_PROMPT_TOKEN_BUDGET = int(os.getenv("CLAUDE_PROMPT_TOKEN_BUDGET", "2000"))
+
+# Compartilhar um único processo entre pedidos idênticos simultâneos que iniciam
+# conversa (opcional). Como no cache, quem aproveita a chamada de outro recebe a
+# resposta sem sessão (conversation_id None); turnos de sessões retomadas nunca
+# são compartilhados
+CLAUDE_SINGLE_FLIGHT = json.loads(os.getenv("CLAUDE_SINGLE_FLIGHT", "false").lower())
+
+# Requisições "hedged" para prompts sem conversa (opcional): se a primeira saída do
+# modelo (texto ou resultado) não chegar no p95 observado, uma segunda chamada idêntica
+# é iniciada e vence a que responder primeiro. Limitadas a uma porcentagem das chamadas
+# e só ativadas após CLAUDE_HEDGE_MIN_SAMPLES medidas do tempo até a primeira saída
+CLAUDE_HEDGING = json.loads(os.getenv("CLAUDE_HEDGING", "false").lower())
+CLAUDE_HEDGE_MAX_PERCENT = float(os.getenv("CLAUDE_HEDGE_MAX_PERCENT", "5"))
+CLAUDE_HEDGE_MIN_SAMPLES = int(os.getenv("CLAUDE_HEDGE_MIN_SAMPLES", "20"))
+
+# Circuit breaker: após CLAUDE_BREAKER_FAILURES falhas seguidas (erros ou timeouts),
+# as chamadas falham imediatamente por CLAUDE_BREAKER_COOLDOWN segundos; depois,
+# uma chamada de teste decide se o CLI voltou (0 falhas desativa)
+CLAUDE_BREAKER_FAILURES = int(os.getenv("CLAUDE_BREAKER_FAILURES", "5"))
+CLAUDE_BREAKER_COOLDOWN = int(os.getenv("CLAUDE_BREAKER_COOLDOWN", "30"))
+
+# Métricas no formato do Prometheus: porta do endpoint HTTP local e/ou arquivo
+# regravado a cada CLAUDE_METRICS_FILE_INTERVAL segundos (vazio/0 desativa)
+CLAUDE_METRICS_PORT = int(os.getenv("CLAUDE_METRICS_PORT", "0"))
+CLAUDE_METRICS_FILE = os.getenv("CLAUDE_METRICS_FILE", "")
+CLAUDE_METRICS_FILE_INTERVAL = int(os.getenv("CLAUDE_METRICS_FILE_INTERVAL", "15"))
 
 # Configurações de log
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
@@ -6,8 +6,183 @@ Este script permite enviar mensagens, listar conversas e gerenciar sessões.
 
 import sys
 import os
+import json
+import time
+import hashlib
 import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from claudechat.utils.session_manager import SessionManager
+from claudechat.claudechat_integration import ClaudeIntegration
+from claudechat.utils.claude_cli import send_to_claude
+from claudechat.utils.usage_store import get_usage_store
+from config.settings import CLAUDE_BATCH_MAX_CONCURRENCY
+
+def ler_prompts(arquivo):
+    """
+    Lê os prompts de um arquivo JSONL (ou da entrada padrão com "-").
+    
+    Cada linha pode ser um objeto {"id": ..., "prompt": ..., "context": ...}
+    ou texto simples. Sem "id", o ID é derivado do prompt e do contexto.
+    
+    Yields:
+        dict: Prompt com "id", "prompt" e "context"
+    """
+    entrada = sys.stdin if arquivo == "-" else open(arquivo, 'r', encoding='utf-8')
+    try:
+        for linha in entrada:
+            linha = linha.strip()
+            if not linha:
+                continue
+            try:
+                item = json.loads(linha)
+            except json.JSONDecodeError:
+                item = linha
+            if not isinstance(item, dict):
+                item = {"prompt": str(item)}
+            if not item.get("prompt"):
+                continue
+            if not item.get("id"):
+                # Sem contexto, só o prompt (mantém os IDs de saídas já gravadas)
+                chave = item["prompt"]
+                if item.get("context"):
+                    chave = json.dumps([item["prompt"], item["context"]], ensure_ascii=False)
+                item["id"] = hashlib.sha256(chave.encode("utf-8")).hexdigest()[:16]
+            yield {"id": str(item["id"]), "prompt": item["prompt"], "context": item.get("context")}
+    finally:
+        if entrada is not sys.stdin:
+            entrada.close()
+
+def ids_concluidos(saida):
+    """
+    Retorna os IDs que já têm resultado sem erro no arquivo de saída.
+    
+    Args:
+        saida (str): Caminho do arquivo JSONL de resultados
+        
+    Returns:
+        set: IDs concluídos
+    """
+    concluidos = set()
+    if not os.path.exists(saida):
+        return concluidos
+    with open(saida, 'r', encoding='utf-8') as f:
+        for linha in f:
+            try:
+                resultado = json.loads(linha)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(resultado, dict) and not resultado.get("error"):
+                concluidos.add(str(resultado.get("id")))
+    return concluidos
+
+def processar_prompt(item):
+    """Envia um prompt ao Claude na fila "batch" e mede o tempo."""
+    inicio = time.time()
+    try:
+        resposta, conversation_id = send_to_claude(
+            item["prompt"], context=item["context"], user_id="lote", lane="batch"
+        )
+        erro = resposta[len("Erro: "):] if resposta.startswith("Erro:") else None
+    except Exception as e:
+        resposta, conversation_id, erro = None, None, str(e)
+    
+    return {
+        "id": item["id"],
+        "response": None if erro else resposta,
+        "error": erro,
+        "conversation_id": conversation_id,
+        "started_at": inicio,
+        "duration_s": round(time.time() - inicio, 3)
+    }
+
+def executar_lote(arquivo, saida, paralelo):
+    """
+    Envia os prompts de um arquivo ao Claude com paralelismo limitado.
+    
+    Cada resultado é gravado no arquivo de saída assim que termina. Prompts
+    que já têm resultado sem erro na saída são pulados, então executar de
+    novo retoma de onde parou.
+    
+    Args:
+        arquivo (str): Arquivo JSONL de prompts ("-" para a entrada padrão)
+        saida (str): Arquivo JSONL de resultados
+        paralelo (int): Número máximo de prompts em andamento
+    """
+    concluidos = ids_concluidos(saida)
+    vistos = set()
+    enviados = pulados = duplicados = erros = 0
+    
+    with open(saida, 'a', encoding='utf-8') as out, ThreadPoolExecutor(max_workers=paralelo) as executor:
+        pendentes = set()
+        
+        def gravar(futuros):
+            nonlocal erros
+            for futuro in futuros:
+                resultado = futuro.result()
+                if resultado["error"]:
+                    erros += 1
+                out.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+                out.flush()
+        
+        for item in ler_prompts(arquivo):
+            # O mesmo ID pode aparecer de novo no arquivo; enviar só uma vez
+            if item["id"] in vistos:
+                duplicados += 1
+                continue
+            vistos.add(item["id"])
+            if item["id"] in concluidos:
+                pulados += 1
+                continue
+            
+            # Manter no máximo `paralelo` prompts em memória/andamento
+            if len(pendentes) >= paralelo:
+                prontos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                gravar(prontos)
+            
+            pendentes.add(executor.submit(processar_prompt, item))
+            enviados += 1
+        
+        gravar(wait(pendentes).done)
+    
+    print(f"Lote concluído: {enviados} enviados, {pulados} já concluídos, "
+          f"{duplicados} repetidos no arquivo, {erros} com erro.", file=sys.stderr)
+
+def mostrar_uso(limite, dias=None):
+    """
+    Mostra as sessões mais lentas e mais caras do registro de uso.
+    
+    Args:
+        limite (int): Número de sessões em cada lista
+        dias (int, opcional): Considerar apenas os últimos N dias
+    """
+    store = get_usage_store()
+    desde = time.time() - dias * 86400 if dias else None
+    
+    for ordem, titulo in (("duration", "Sessões mais lentas"), ("cost", "Sessões mais caras")):
+        sessoes = store.top_sessions(ordem, limite, desde)
+        if not sessoes:
+            print("Nenhum registro de uso encontrado.")
+            return
+        
+        print(f"{titulo}:")
+        for s in sessoes:
+            print(f"- {s['session_id']}: {s['duration_ms'] / 1000:.1f}s no total "
+                  f"(máx. {s['max_duration_ms'] / 1000:.1f}s), US$ {s['cost_usd']:.4f}, "
+                  f"{s['calls']} chamadas, {s['turns']} turnos, "
+                  f"{s['input_tokens']}+{s['output_tokens']} tokens"
+                  + (f", {s['errors']} com erro" if s['errors'] else ""))
+        print()
+
+def reindexar(completo=False):
+    """
+    Atualiza o índice de metadados das sessões do Claude CLI.
+    
+    Args:
+        completo (bool): Reler todos os arquivos, e não apenas os alterados
+    """
+    inicio = time.monotonic()
+    total = ClaudeIntegration().rebuild_session_index(full=completo)
+    print(f"Índice de sessões atualizado: {total} sessões em {time.monotonic() - inicio:.2f}s")
 
 def main():
     parser = argparse.ArgumentParser(description="Interação com Claude via SessionManager")
@@ -31,12 +206,40 @@ def main():
     create_parser = subparsers.add_parser("criar", help="Criar nova conversa")
     create_parser.add_argument("titulo", help="Título da nova conversa")
     
+    # Comando para processar prompts em lote
+    batch_parser = subparsers.add_parser("lote", help="Enviar prompts em lote a partir de um arquivo JSONL")
+    batch_parser.add_argument("arquivo", help="Arquivo JSONL com os prompts (\"-\" para a entrada padrão)")
+    batch_parser.add_argument("-o", "--saida", required=True, help="Arquivo JSONL de resultados (retoma se já existir)")
+    batch_parser.add_argument("-j", "--paralelo", type=int, default=CLAUDE_BATCH_MAX_CONCURRENCY,
+                              help="Número máximo de prompts em paralelo")
+    
+    # Comando para ver o registro de uso
+    usage_parser = subparsers.add_parser("uso", help="Mostrar as sessões mais lentas e mais caras")
+    usage_parser.add_argument("-n", "--limite", type=int, default=10, help="Número de sessões por lista")
+    usage_parser.add_argument("-d", "--dias", type=int, help="Considerar apenas os últimos N dias")
+    
+    # Comando para atualizar o índice de sessões
+    reindex_parser = subparsers.add_parser("reindexar", help="Atualizar o índice de metadados das sessões")
+    reindex_parser.add_argument("--completo", action="store_true",
+                                help="Reler todos os arquivos, e não apenas os alterados")
+    
     # Comando para ver tarefas (todos)
     todos_parser = subparsers.add_parser("tarefas", help="Listar tarefas de uma sessão")
     todos_parser.add_argument("sessao", help="ID da sessão")
     
     args = parser.parse_args()
     
+    # O lote, o uso e a reindexação não usam o gerenciador de sessões
+    if args.comando == "lote":
+        executar_lote(args.arquivo, args.saida, max(1, args.paralelo))
+        return
+    if args.comando == "uso":
+        mostrar_uso(args.limite, args.dias)
+        return
+    if args.comando == "reindexar":
+        reindexar(args.completo)
+        return
+    
     # Inicializar gerenciador de sessões
     session_manager = SessionManager()
     
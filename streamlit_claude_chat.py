@@ -13,7 +13,8 @@ from pathlib import Path
 # Adicionar o diretório raiz ao PATH para importar corretamente os módulos
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from utils.claude_cli import send_to_claude
+from utils.claude_cli import send_to_claude, get_circuit_breaker_state
+from utils import prompt_builder
 
 #########################################################
 # DEFINIÇÃO DE TODAS AS FUNÇÕES - INÍCIO
@@ -72,23 +73,9 @@ def extract_user_info(message):
     return None
 
 # Função para criar o contexto para o Claude com base na memória
-def build_context():
-    context = ""
-    if st.session_state.memory["user_name"]:
-        context += f"O nome do usuário é {st.session_state.memory['user_name']}. "
-    
-    # Adicionar outras informações da memória quando necessário
-    for key, value in st.session_state.memory.get("context", {}).items():
-        context += f"{key}: {value}. "
-    
-    # Adicionar preferências do usuário, se houver
-    if st.session_state.memory.get("preferences"):
-        context += "Preferências do usuário: "
-        for pref, value in st.session_state.memory.get("preferences", {}).items():
-            context += f"{pref}: {value}, "
-        context = context.rstrip(", ") + ". "
-    
-    return context.strip()
+def build_context(message=""):
+    # Itens mais relevantes para a mensagem, dentro do orçamento de tokens do prompt
+    return prompt_builder.build_context(st.session_state.memory, message)
 
 # Função para carregar e gerenciar todos
 def load_todos_for_session(session_id):
@@ -601,6 +588,13 @@ for message in st.session_state.messages:
 
 # Barra lateral com controles e informações
 with st.sidebar:
+    # Avisar quando o Claude CLI está falhando e as chamadas estão sendo recusadas
+    breaker = get_circuit_breaker_state()
+    if breaker["state"] == "open":
+        st.warning(f"Claude CLI indisponível: novas mensagens em {int(breaker['retry_in']) + 1}s.")
+    elif breaker["state"] == "half_open":
+        st.info("Claude CLI em recuperação: testando a conexão.")
+    
     st.subheader("Perfil do Usuário")
     
     # Campo para editar o nome diretamente
@@ -829,17 +823,19 @@ if prompt:
     with st.chat_message("assistant"):
         message_placeholder = st.empty()
         
-        # Construir o prompt com o contexto da memória
-        context = build_context()
-        enhanced_prompt = prompt
-        if context:
-            enhanced_prompt = f"[CONTEXTO: {context}]\n\n{prompt}"
+        # Contexto da memória (incluído no prompt pelo send_to_claude)
+        context = build_context(prompt)
         
         # Primeiro, obter a resposta completa do Claude
         with st.spinner("Claude está gerando a resposta..."):
             full_response, conv_id = send_to_claude(
-                enhanced_prompt, 
-                conversation_id=st.session_state.conversation_id
+                prompt, 
+                conversation_id=st.session_state.conversation_id,
+                context=context,
+                # A conversa continua nos próximos turnos: a resposta precisa vir de uma sessão do CLI
+                use_cache=False,
+                use_single_flight=False,
+                user_id=st.session_state.session_id
             )
             
             # Atualizar o ID da conversa se for novo
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Substituto do Claude Code CLI para testes de carga
+
+Aceita os mesmos argumentos usados por utils/claude_cli.py (-p, -c,
+--resume, --output-format, --verbose, --include-partial-messages), lê o
+prompt da linha de comando ou da entrada padrão e responde no mesmo formato
+do CLI real, sem acessar nenhum serviço. Para usá-lo:
+
+    CLAUDE_PATH=tools/fake_claude.py streamlit run streamlit_claude_chat.py
+
+O comportamento é configurado por variáveis de ambiente:
+
+    FAKE_CLAUDE_STARTUP        Tempo de inicialização antes de ler o prompt (s, padrão 0.3)
+    FAKE_CLAUDE_STDIN_TIMEOUT  Espera máxima pelo prompt na entrada padrão, como o CLI real
+                               (s, padrão 3; 0 espera indefinidamente)
+    FAKE_CLAUDE_LATENCY        Tempo entre o prompt e o primeiro token (s, padrão 0.5)
+    FAKE_CLAUDE_JITTER         Variação aleatória somada à latência (s, padrão 0)
+    FAKE_CLAUDE_TOKEN_RATE     Tokens por segundo na resposta (0 = instantâneo, padrão 50)
+    FAKE_CLAUDE_OUTPUT_TOKENS  Tokens na resposta (padrão 100)
+    FAKE_CLAUDE_FAILURE_RATE   Fração das chamadas que terminam com erro (padrão 0)
+    FAKE_CLAUDE_HANG_RATE      Fração das chamadas que nunca respondem (padrão 0)
+    FAKE_CLAUDE_STDERR_BYTES   Bytes de log escritos na saída de erro antes da resposta (padrão 0)
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import select
+import argparse
+
+WORDS = ("claude", "resposta", "teste", "de", "carga", "com", "texto", "simulado",
+         "para", "medir", "latência", "e", "vazão", "do", "cli")
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return float(default)
+
+
+def emit(record):
+    """Escreve um evento stream-json (um objeto por linha)."""
+    sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Substituto do Claude Code CLI para testes")
+    parser.add_argument("prompt", nargs="*")
+    parser.add_argument("-p", "--print", action="store_true")
+    parser.add_argument("-c", "--continue", dest="continue_", action="store_true")
+    parser.add_argument("-r", "--resume")
+    parser.add_argument("--output-format", default="text", choices=("text", "json", "stream-json"))
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--include-partial-messages", action="store_true")
+    args = parser.parse_args()
+
+    time.sleep(_env_float("FAKE_CLAUDE_STARTUP", 0.3))
+
+    stdin_timeout = _env_float("FAKE_CLAUDE_STDIN_TIMEOUT", 3)
+    if not args.prompt and stdin_timeout > 0 and not select.select([sys.stdin], [], [], stdin_timeout)[0]:
+        # Mesmo comportamento do CLI real quando o prompt não chega a tempo
+        sys.stderr.write(f"Warning: no stdin data received in {stdin_timeout:g}s, proceeding without it.\n"
+                         "Error: Input must be provided either through stdin or as a prompt argument "
+                         "when using --print\n")
+        return 1
+    prompt = " ".join(args.prompt) if args.prompt else sys.stdin.read()
+    # Como no CLI real, a duração conta a partir do prompt (não do tempo ocioso no pool)
+    started = time.monotonic()
+    session_id = args.resume or str(uuid.uuid4())
+    stream = args.output_format == "stream-json"
+
+    if random.random() < _env_float("FAKE_CLAUDE_HANG_RATE", 0):
+        while True:
+            time.sleep(3600)
+
+    stderr_bytes = int(_env_float("FAKE_CLAUDE_STDERR_BYTES", 0))
+    line_number = 0
+    while stderr_bytes > 0:
+        line = f"[debug] linha de log simulada {line_number}\n"
+        sys.stderr.write(line)
+        stderr_bytes -= len(line)
+        line_number += 1
+    sys.stderr.flush()
+
+    if stream:
+        emit({"type": "system", "subtype": "init", "session_id": session_id,
+              "model": "fake-claude", "tools": []})
+
+    time.sleep(_env_float("FAKE_CLAUDE_LATENCY", 0.5) + random.random() * _env_float("FAKE_CLAUDE_JITTER", 0))
+
+    input_tokens = max(1, len(prompt) // 4)
+    output_tokens = max(1, int(_env_float("FAKE_CLAUDE_OUTPUT_TOKENS", 100)))
+    failed = random.random() < _env_float("FAKE_CLAUDE_FAILURE_RATE", 0)
+    token_rate = _env_float("FAKE_CLAUDE_TOKEN_RATE", 50)
+
+    tokens = [] if failed else [(WORDS[i % len(WORDS)] + " ") for i in range(output_tokens)]
+    if stream and args.include_partial_messages and tokens:
+        emit({"type": "stream_event", "session_id": session_id,
+              "event": {"type": "content_block_start", "index": 0,
+                        "content_block": {"type": "text", "text": ""}}})
+    for token in tokens:
+        if token_rate > 0:
+            time.sleep(1.0 / token_rate)
+        if stream and args.include_partial_messages:
+            emit({"type": "stream_event", "session_id": session_id,
+                  "event": {"type": "content_block_delta", "index": 0,
+                            "delta": {"type": "text_delta", "text": token}}})
+        elif not stream and args.output_format == "text":
+            sys.stdout.write(token)
+            sys.stdout.flush()
+
+    text = "".join(tokens).strip()
+    if stream and tokens:
+        emit({"type": "assistant", "session_id": session_id,
+              "message": {"role": "assistant", "content": [{"type": "text", "text": text}]}})
+
+    duration_ms = int((time.monotonic() - started) * 1000)
+    result = {
+        "type": "result",
+        "subtype": "error_during_execution" if failed else "success",
+        "is_error": failed,
+        "result": "Falha simulada do Claude CLI" if failed else text,
+        "session_id": session_id,
+        "duration_ms": duration_ms,
+        "duration_api_ms": duration_ms,
+        "num_turns": 1,
+        "total_cost_usd": round((input_tokens * 3 + output_tokens * 15) / 1e6, 6),
+        "usage": {"input_tokens": input_tokens, "output_tokens": 0 if failed else output_tokens}
+    }
+
+    if stream or args.output_format == "json":
+        emit(result)
+    elif failed:
+        sys.stderr.write(result["result"] + "\n")
+    else:
+        sys.stdout.write("\n")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
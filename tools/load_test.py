@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Teste de carga da camada do Claude CLI (utils/claude_cli.py)
+
+Executa chamadas completas e/ou stream_claude_response com a concorrência
+indicada e informa vazão, percentis (p50/p95/p99) do tempo até o primeiro
+fragmento e da latência total, além do uso de CPU e memória do processo.
+
+O modo "send" usa stream_claude_events, que passa pelos mesmos controles
+de send_to_claude (admissão, circuit breaker e leitor da saída) e permite
+medir quando chega a primeira saída do modelo (texto ou resultado).
+
+Por padrão usa o CLI simulado (tools/fake_claude.py); as variáveis
+FAKE_CLAUDE_* controlam o seu comportamento. Exemplo:
+
+    FAKE_CLAUDE_LATENCY=0.2 python tools/load_test.py -n 200 -j 16 --modo stream
+"""
+
+import os
+import sys
+import time
+import resource
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKE_CLAUDE = os.path.join(ROOT_DIR, "tools", "fake_claude.py")
+
+
+def percentile(values, pct):
+    """Percentil por posição (valores já ordenados)."""
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def run_send(stream_claude_events, prompt, user_id):
+    """Executa uma chamada completa; retorna (ttfb, total, erro)."""
+    started = time.monotonic()
+    first_output = None
+    error = False
+    for event in stream_claude_events(prompt, user_id=user_id):
+        if event["type"] in ("text", "result") and first_output is None:
+            first_output = time.monotonic() - started
+        elif event["type"] == "error":
+            error = True
+    return first_output, time.monotonic() - started, error
+
+
+def run_stream(stream_claude_response, prompt, user_id):
+    """Executa uma chamada em streaming; retorna (ttfb, total, erro)."""
+    started = time.monotonic()
+    first_chunk = None
+    error = False
+    for chunk, done, _ in stream_claude_response(prompt, user_id=user_id, use_cache=False):
+        if done and chunk.startswith("Erro:"):
+            # A mensagem de erro não é um fragmento da resposta
+            error = True
+        elif chunk and first_chunk is None:
+            first_chunk = time.monotonic() - started
+    return first_chunk, time.monotonic() - started, error
+
+
+def report(mode, results, elapsed):
+    """Imprime o resumo de um modo."""
+    ttfbs = sorted(r[0] for r in results if r[0] is not None)
+    totals = sorted(r[1] for r in results)
+    errors = sum(1 for r in results if r[2])
+
+    def fmt(values):
+        if not values:
+            return "-"
+        return " / ".join(f"{percentile(values, p) * 1000:.0f}" for p in (50, 95, 99))
+
+    print(f"\n== {mode} ==")
+    print(f"Chamadas: {len(results)} ({errors} com erro) em {elapsed:.2f}s")
+    print(f"Vazão: {len(results) / elapsed:.2f} chamadas/s")
+    print(f"Primeiro fragmento p50/p95/p99 (ms): {fmt(ttfbs)}")
+    print(f"Latência total p50/p95/p99 (ms): {fmt(totals)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga da camada do Claude CLI")
+    parser.add_argument("-n", "--requisicoes", type=int, default=100, help="Número de chamadas por modo")
+    parser.add_argument("-j", "--concorrencia", type=int, default=8, help="Chamadas simultâneas")
+    parser.add_argument("--modo", choices=("send", "stream", "ambos"), default="ambos",
+                        help="Função testada")
+    parser.add_argument("--tamanho-prompt", type=int, default=200, help="Tamanho do prompt em caracteres")
+    parser.add_argument("--claude-real", action="store_true",
+                        help="Usar o CLAUDE_PATH configurado em vez do CLI simulado")
+    args = parser.parse_args()
+
+    # As configurações são lidas na importação: ajustar o ambiente antes
+    if not args.claude_real:
+        os.environ["CLAUDE_PATH"] = FAKE_CLAUDE
+    os.environ.setdefault("CLAUDE_MAX_CONCURRENCY", str(args.concorrencia))
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    sys.path.insert(0, ROOT_DIR)
+
+    from utils.claude_cli import stream_claude_events, stream_claude_response
+
+    modes = ("send", "stream") if args.modo == "ambos" else (args.modo,)
+    padding = "x" * max(0, args.tamanho_prompt - 20)
+
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    wall_started = time.monotonic()
+
+    for mode in modes:
+        fn, call = (stream_claude_events, run_send) if mode == "send" else (stream_claude_response, run_stream)
+        counter = iter(range(args.requisicoes))
+        lock = threading.Lock()
+
+        def task(_):
+            with lock:
+                i = next(counter)
+            # Prompts distintos: evita que o single-flight agrupe as chamadas
+            return call(fn, f"{mode} #{i} {padding}", f"carga-{i % args.concorrencia}")
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=args.concorrencia) as executor:
+            results = list(executor.map(task, range(args.requisicoes)))
+        report(mode, results, time.monotonic() - started)
+
+    wall = time.monotonic() - wall_started
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (usage.ru_utime - usage_before.ru_utime) + (usage.ru_stime - usage_before.ru_stime)
+    children_cpu = ((children.ru_utime - children_before.ru_utime)
+                    + (children.ru_stime - children_before.ru_stime))
+
+    print("\n== processo ==")
+    print(f"CPU do processo: {cpu:.2f}s ({cpu / wall * 100:.1f}% de um núcleo)")
+    print(f"CPU dos processos filhos: {children_cpu:.2f}s")
+    # ru_maxrss é informado em KiB no Linux
+    print(f"RSS máximo: {usage.ru_maxrss / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""
+Cliente assíncrono para o Claude Code CLI
+
+Versões baseadas em asyncio de send_to_claude e stream_claude_response.
+Os processos são iniciados com asyncio.create_subprocess_exec e recebem o
+prompt pela entrada padrão, de modo que um único event loop conduz centenas
+de chamadas simultâneas sem manter uma thread bloqueada em leitura por prompt.
+
+As chamadas passam pelo mesmo controle de admissão das síncronas
+(utils.scheduler): contam no limite global de processos
+(CLAUDE_MAX_CONCURRENCY, que também define a concorrência do cliente
+assíncrono) e nas filas "interactive"/"batch", aguardando a vaga sem
+bloquear o event loop.
+
+Cancelar a tarefa (ou fechar o gerador de streaming) encerra o processo
+filho do Claude CLI.
+"""
+
+import os
+import codecs
+import signal
+import asyncio
+import logging
+import weakref
+from contextlib import asynccontextmanager
+from config.settings import CLAUDE_PATH
+from utils.claude_cli import (
+    _cli_args, _parse_output, _stream_error, _Deadlines, _CallStats, CallTimeout, StreamJsonParser,
+    ChunkCoalescer, _circuit_breaker, _unavailable_message, _record_usage, _StderrBuffer, _BUSY_MESSAGE
+)
+from utils.scheduler import get_scheduler, QueueTimeout
+
+logger = logging.getLogger(__name__)
+
+# Por event loop: sessão -> [asyncio.Lock, chamadas usando o lock]
+_session_locks = weakref.WeakKeyDictionary()
+
+@asynccontextmanager
+async def _hold_session(session_id):
+    """Executa as chamadas de uma mesma sessão uma de cada vez."""
+    if not session_id:
+        yield
+        return
+
+    sessions = _session_locks.setdefault(asyncio.get_running_loop(), {})
+    entry = sessions.get(session_id)
+    if entry is None:
+        entry = sessions[session_id] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del sessions[session_id]
+
+async def _spawn(conversation_id=None):
+    """Inicia o processo do Claude CLI, que lê o prompt pela entrada padrão."""
+    args = _cli_args(conversation_id)
+    logger.debug(f"Executando comando assíncrono: {CLAUDE_PATH} {' '.join(args)}")
+
+    return await asyncio.create_subprocess_exec(
+        CLAUDE_PATH, *args,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True
+    )
+
+def _record_outcome(stats):
+    """Informa o resultado da chamada ao circuit breaker compartilhado."""
+    if stats.status == "ok":
+        _circuit_breaker.record_success()
+    elif stats.status in ("error", "timeout"):
+        _circuit_breaker.record_failure()
+    else:
+        _circuit_breaker.release()
+
+async def _drain_stderr(stream, buffer):
+    """Lê a saída de erro enquanto o processo roda, para o pipe nunca encher."""
+    while True:
+        data = await stream.read(65536)
+        buffer.feed(data, final=not data)
+        for line in buffer.take_lines():
+            logger.debug(f"Claude CLI (stderr): {line}")
+        if not data:
+            return
+
+async def _kill(process):
+    """Encerra o processo filho e os processos do seu grupo."""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+    await process.wait()
+
+async def async_send_to_claude(message, conversation_id=None, user_id=None, lane="interactive"):
+    """
+    Envia uma mensagem para o Claude Code CLI sem bloquear o event loop.
+
+    Args:
+        message (str): A mensagem para enviar ao Claude
+        conversation_id (str, opcional): ID da sessão do Claude CLI a retomar
+        user_id (str, opcional): Usuário que fez o pedido (para o rodízio da fila)
+        lane (str): Fila de prioridade ("interactive" ou "batch")
+
+    Returns:
+        tuple: (resposta, conversation_id)
+    """
+    if not _circuit_breaker.allow():
+        return f"Erro: {_unavailable_message()}", None
+
+    admitted = False
+    try:
+        # Aguardar a chamada anterior da mesma sessão antes de ocupar uma vaga
+        async with _hold_session(conversation_id), get_scheduler().async_slot(user_id, lane):
+            admitted = True
+            process = None
+            drain = None
+            prompt = message.encode("utf-8")
+            stats = _CallStats(len(prompt), conversation_id)
+            try:
+                process = await _spawn(conversation_id)
+                stats.spawned(process.pid)
+                stderr = _StderrBuffer()
+                drain = asyncio.create_task(_drain_stderr(process.stderr, stderr))
+
+                process.stdin.write(prompt)
+                await process.stdin.drain()
+                process.stdin.close()
+                stats.sent()
+
+                # Coletar resposta, acompanhando os prazos (o prazo aprendido vale
+                # só até a primeira saída do modelo)
+                deadlines = _Deadlines.for_call(len(prompt), conversation_id)
+                stats.deadline = deadlines.limit
+                parser = StreamJsonParser(conversation_id)
+                decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+                output = []
+                while True:
+                    try:
+                        data = await asyncio.wait_for(process.stdout.read(65536),
+                                                      timeout=deadlines.remaining())
+                    except asyncio.TimeoutError:
+                        deadlines.check()
+                        continue
+                    if not data:
+                        break
+                    deadlines.data_received()
+                    stats.data_received(len(data))
+                    output.append(data)
+                    for event in parser.feed(decoder.decode(data)):
+                        if event["type"] in ("text", "result"):
+                            deadlines.output_started()
+                            stats.output_started()
+
+                try:
+                    await asyncio.wait_for(asyncio.shield(drain), timeout=1)
+                except asyncio.TimeoutError:
+                    pass
+                stats.finish_resources()
+                try:
+                    await asyncio.wait_for(process.wait(), timeout=1)
+                except asyncio.TimeoutError:
+                    pass
+
+                result = _parse_output(
+                    b"".join(output).decode("utf-8", errors="replace"),
+                    stderr.text(),
+                    conversation_id
+                )
+                stats.session_id = result["conversation_id"]
+                stats.status = "error" if result["error"] else "ok"
+                return result["response"], result["conversation_id"]
+
+            except CallTimeout as e:
+                stats.status = "timeout"
+                stats.timeout_kind = e.kind
+                logger.error(f"Timeout ao aguardar resposta do Claude: {str(e)}")
+                return "Erro: A resposta demorou muito tempo.", None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                stats.status = "error"
+                logger.exception("Erro inesperado ao comunicar com o Claude CLI")
+                return f"Erro: {str(e)}", None
+            finally:
+                if process is not None:
+                    stats.finish_resources()
+                    await _kill(process)
+                if drain is not None and not drain.done():
+                    drain.cancel()
+                stats.record(process.returncode if process is not None else None)
+                _record_outcome(stats)
+    except QueueTimeout as e:
+        _circuit_breaker.release()
+        logger.warning(f"Pedido recusado pelo controle de admissão: {str(e)}")
+        return f"Erro: {_BUSY_MESSAGE}", None
+    except BaseException:
+        # Cancelado antes de ser admitido: sem veredito (depois disso, o
+        # resultado já foi informado ao circuit breaker)
+        if not admitted:
+            _circuit_breaker.release()
+        raise
+
+
+async def async_stream_claude_response(message, conversation_id=None, user_id=None, lane="interactive"):
+    """
+    Envia uma mensagem para o Claude Code CLI e retorna a resposta em streaming.
+
+    Para encerrar o processo assim que o consumo for interrompido, use
+    ``contextlib.aclosing`` ou chame ``aclose()`` no gerador.
+
+    Args:
+        message (str): A mensagem para enviar ao Claude
+        conversation_id (str, opcional): ID da sessão do Claude CLI a retomar
+        user_id (str, opcional): Usuário que fez o pedido (para o rodízio da fila)
+        lane (str): Fila de prioridade ("interactive" ou "batch")
+
+    Yields:
+        tuple: (fragmento_de_resposta, flag_de_finalização, conversation_id)
+    """
+    if not _circuit_breaker.allow():
+        yield f"Erro: {_unavailable_message()}", True, conversation_id
+        return
+
+    admitted = False
+    try:
+        # Aguardar a chamada anterior da mesma sessão antes de ocupar uma vaga
+        async with _hold_session(conversation_id), get_scheduler().async_slot(user_id, lane):
+            admitted = True
+            process = None
+            drain = None
+            prompt = message.encode("utf-8")
+            stats = _CallStats(len(prompt), conversation_id)
+            try:
+                process = await _spawn(conversation_id)
+                stats.spawned(process.pid)
+                stderr = _StderrBuffer()
+                drain = asyncio.create_task(_drain_stderr(process.stderr, stderr))
+
+                # Enviar o prompt e fechar a entrada para o CLI começar a responder
+                process.stdin.write(prompt)
+                await process.stdin.drain()
+                process.stdin.close()
+                stats.sent()
+
+                parser = StreamJsonParser(conversation_id)
+                coalescer = ChunkCoalescer()
+                deadlines = _Deadlines.for_call(len(prompt), conversation_id)
+                stats.deadline = deadlines.limit
+                decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+                current_id = conversation_id
+
+                while True:
+                    timeouts = [t for t in (coalescer.time_until_due(), deadlines.remaining())
+                                if t is not None]
+                    try:
+                        data = await asyncio.wait_for(process.stdout.read(65536),
+                                                      timeout=min(timeouts) if timeouts else None)
+                    except asyncio.TimeoutError:
+                        deadlines.check()
+                        # Prazo de agrupamento esgotado sem novos dados
+                        if coalescer.is_due():
+                            yield coalescer.flush(), False, current_id
+                        continue
+
+                    if data:
+                        deadlines.data_received()
+                        stats.data_received(len(data))
+
+                    text = decoder.decode(data, final=not data)
+                    for event in parser.feed(text if data else text + "\n"):
+                        if event["type"] in ("text", "result"):
+                            deadlines.output_started()
+                            stats.output_started()
+                        if event["type"] == "session":
+                            current_id = current_id or event["session_id"]
+                            yield "", False, current_id
+                        elif event["type"] == "text":
+                            chunk = coalescer.add(event["text"])
+                            if chunk:
+                                yield chunk, False, current_id
+
+                    if not data:
+                        break
+
+                # Enviar qualquer texto restante
+                chunk = coalescer.flush()
+                if chunk:
+                    yield chunk, False, current_id
+
+                # Verificar se houve erro
+                try:
+                    await asyncio.wait_for(asyncio.shield(drain), timeout=1)
+                except asyncio.TimeoutError:
+                    pass
+                error = stderr.text()
+                _record_usage(parser.result)
+                # Última amostra de recursos antes de o processo ser recolhido
+                stats.finish_resources()
+                try:
+                    await asyncio.wait_for(process.wait(), timeout=1)
+                except asyncio.TimeoutError:
+                    pass
+                result_error = _stream_error(parser, error, process.returncode)
+                if result_error:
+                    stats.status = "error"
+                    logger.error(f"Erro durante o streaming do Claude CLI: {result_error}")
+                    yield f"Erro: {result_error}", True, current_id
+                    return
+
+                # Sinalizar o fim do streaming
+                stats.session_id = parser.conversation_id
+                stats.status = "ok"
+                yield "", True, current_id
+
+            except (asyncio.CancelledError, GeneratorExit):
+                raise
+            except CallTimeout as e:
+                stats.status = "timeout"
+                stats.timeout_kind = e.kind
+                logger.error(f"Timeout ao aguardar resposta do Claude: {str(e)}")
+                yield "Erro: A resposta demorou muito tempo.", True, None
+            except Exception as e:
+                stats.status = "error"
+                logger.exception("Erro inesperado durante o streaming com o Claude CLI")
+                yield f"Erro: {str(e)}", True, None
+            finally:
+                if process is not None:
+                    stats.finish_resources()
+                    await _kill(process)
+                if drain is not None and not drain.done():
+                    drain.cancel()
+                stats.record(process.returncode if process is not None else None)
+                _record_outcome(stats)
+    except QueueTimeout as e:
+        _circuit_breaker.release()
+        logger.warning(f"Pedido recusado pelo controle de admissão: {str(e)}")
+        yield f"Erro: {_BUSY_MESSAGE}", True, conversation_id
+    except BaseException:
+        # Cancelado antes de ser admitido: sem veredito (depois disso, o
+        # resultado já foi informado ao circuit breaker)
+        if not admitted:
+            _circuit_breaker.release()
+        raise
+
@@ -1,9 +1,32 @@
 import subprocess
-import re
+import selectors
+import codecs
+import json
 import time
 import os
+import queue
+import signal
 import logging
-from config.settings import CLAUDE_PATH, CLAUDE_TIMEOUT, LOG_LEVEL
+import threading
+from collections import deque
+from contextlib import contextmanager
+from config.settings import (
+    CLAUDE_PATH, CLAUDE_TIMEOUT, LOG_LEVEL, CLAUDE_PARTIAL_MESSAGES,
+    CLAUDE_FIRST_BYTE_TIMEOUT, CLAUDE_IDLE_TIMEOUT,
+    CLAUDE_STREAM_FLUSH_MS, CLAUDE_STREAM_FLUSH_BYTES,
+    CLAUDE_POOL_SIZE, CLAUDE_POOL_IDLE_TIMEOUT, CLAUDE_POOL_HEALTH_INTERVAL,
+    CLAUDE_CACHE_ENABLED, CLAUDE_SINGLE_FLIGHT,
+    CLAUDE_HEDGING, CLAUDE_HEDGE_MAX_PERCENT, CLAUDE_HEDGE_MIN_SAMPLES,
+    CLAUDE_BREAKER_FAILURES, CLAUDE_BREAKER_COOLDOWN, CLAUDE_USAGE_ENABLED,
+    CLAUDE_STDERR_MAX_BYTES
+)
+from utils.worker_pool import ClaudeWorkerPool, kill_process_group, spawn_process
+from utils.response_cache import get_response_cache
+from utils.usage_store import get_usage_store
+from utils.latency_model import get_latency_model
+from utils.proc_stats import get_process_sampler
+from utils.scheduler import get_scheduler, QueueTimeout
+from utils.metrics import registry as metrics_registry, record_cli_call
 
 # Configurar logging
 logging.basicConfig(
@@ -12,165 +35,1797 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def send_to_claude(message, conversation_id=None):
+_worker_pool = None
+_worker_pool_lock = threading.Lock()
+
+def _get_worker_pool():
     """
-    Envia uma mensagem para o Claude Code CLI e processa a resposta.
+    Retorna o pool de processos do Claude CLI, criando-o na primeira chamada.
+    
+    Returns:
+        ClaudeWorkerPool: O pool, ou None se estiver desativado
+    """
+    global _worker_pool
+    if CLAUDE_POOL_SIZE <= 0:
+        return None
+    
+    with _worker_pool_lock:
+        if _worker_pool is None:
+            _worker_pool = ClaudeWorkerPool(
+                CLAUDE_PATH,
+                size=CLAUDE_POOL_SIZE,
+                idle_timeout=CLAUDE_POOL_IDLE_TIMEOUT,
+                health_interval=CLAUDE_POOL_HEALTH_INTERVAL,
+                # Só a nova conversa tem argumentos fixos; --resume inclui o ID da sessão
+                warm_args=(_cli_args(),)
+            )
+            _worker_pool.start()
+        return _worker_pool
+
+def get_worker_pool_stats():
+    """
+    Retorna as estatísticas do pool de processos do Claude CLI.
+    
+    Returns:
+        dict: Estatísticas do pool, ou None se estiver desativado
+    """
+    pool = _get_worker_pool()
+    return pool.stats() if pool else None
+
+def _collect_metrics():
+    """
+    Amostras de estado para as métricas: escalonador, pool, cache e
+    chamadas compartilhadas.
+    
+    Returns:
+        list: Amostras (nome, tipo, ajuda, rótulos, valor)
+    """
+    scheduler = get_scheduler().stats()
+    samples = [("claude_scheduler_running", "gauge", "Chamadas ao Claude CLI em execução",
+                {}, scheduler["running"])]
+    for lane, lane_stats in scheduler["lanes"].items():
+        labels = {"lane": lane}
+        samples += [
+            ("claude_scheduler_queue_depth", "gauge", "Pedidos aguardando na fila de admissão",
+             labels, lane_stats["queue_depth"]),
+            ("claude_scheduler_admitted_total", "counter", "Pedidos admitidos pelo escalonador",
+             labels, lane_stats["admitted"]),
+            ("claude_scheduler_timeouts_total", "counter", "Pedidos que desistiram na fila de admissão",
+             labels, lane_stats["timeouts"]),
+            ("claude_scheduler_wait_seconds_total", "counter", "Tempo total de espera na fila de admissão",
+             labels, lane_stats["wait_seconds_total"]),
+        ]
+    
+    # Não criar o pool nem o cache só para exportar métricas
+    if _worker_pool is not None:
+        pool = _worker_pool.stats()
+        samples += [
+            ("claude_pool_warm_hits_total", "counter", "Chamadas atendidas por processo aquecido",
+             {}, pool["warm_hits"]),
+            ("claude_pool_cold_starts_total", "counter", "Chamadas que iniciaram processo a frio",
+             {}, pool["cold_starts"]),
+            ("claude_pool_warm_failures_total", "counter",
+             "Processos aquecidos que encerraram antes de ler o prompt", {}, pool["warm_failures"]),
+            ("claude_pool_ready_workers", "gauge", "Processos aquecidos prontos",
+             {}, sum(1 for worker in pool["workers"] if worker["ready"])),
+        ]
+    if CLAUDE_CACHE_ENABLED:
+        cache = get_response_cache().stats()
+        samples += [
+            ("claude_cache_hits_total", "counter", "Respostas servidas pelo cache", {}, cache["hits"]),
+            ("claude_cache_misses_total", "counter", "Consultas ao cache sem resposta", {}, cache["misses"]),
+            ("claude_cache_entries", "gauge", "Respostas guardadas no cache", {}, cache["entries"]),
+        ]
+    
+    breaker = get_circuit_breaker_state()
+    for state in CircuitBreaker.STATES:
+        samples.append(("claude_circuit_breaker_state", "gauge", "Estado do circuit breaker do Claude CLI",
+                        {"state": state}, 1 if breaker["state"] == state else 0))
+    samples.append(("claude_circuit_breaker_opened_total", "counter", "Vezes que o circuit breaker abriu",
+                    {}, breaker["opened"]))
+    samples.append(("claude_circuit_breaker_rejected_total", "counter",
+                    "Chamadas recusadas com o circuit breaker aberto", {}, breaker["rejected"]))
+    
+    model = get_latency_model()
+    if model is not None:
+        for bucket, bucket_stats in model.stats()["buckets"].items():
+            samples.append(("claude_cli_deadline_seconds", "gauge",
+                            "Prazo adaptativo até a primeira saída do modelo, por faixa de tamanho do prompt",
+                            {"prompt_size": bucket}, bucket_stats["deadline"]))
+    
+    hedging = get_hedging_stats()
+    samples += [
+        ("claude_hedge_eligible_total", "counter", "Chamadas sem conversa avaliadas para hedging",
+         {}, hedging["eligible"]),
+        ("claude_hedge_started_total", "counter", "Chamadas duplicadas iniciadas por hedging",
+         {}, hedging["hedged"]),
+        ("claude_hedge_wins_total", "counter", "Chamadas duplicadas que responderam primeiro",
+         {}, hedging["hedge_wins"]),
+    ]
+    
+    single_flight = get_single_flight_stats()
+    samples += [
+        ("claude_single_flight_shared_total", "counter", "Pedidos que aproveitaram uma chamada em andamento",
+         {}, single_flight["shared"]),
+        ("claude_single_flight_in_flight", "gauge", "Chamadas compartilháveis em andamento",
+         {}, single_flight["in_flight"]),
+    ]
+    return samples
+
+def _cli_args(conversation_id=None):
+    """
+    Monta os argumentos do Claude CLI para uma chamada.
+    
+    A saída é pedida no formato stream-json: um objeto JSON por evento,
+    com o ID da sessão, os fragmentos de texto e o registro final.
     
     Args:
-        message (str): A mensagem para enviar ao Claude
-        conversation_id (str, opcional): ID da conversa para continuar
+        conversation_id (str, opcional): ID da sessão do Claude CLI a retomar
         
     Returns:
-        tuple: (resposta, conversation_id)
+        tuple: Argumentos do Claude CLI (sem o executável)
     """
-    try:
-        # Escapar aspas duplas no input para evitar problemas no shell
-        message = message.replace('"', '\\"')
+    # Retomar a sessão pelo ID: "-c" continuaria a conversa mais recente da
+    # máquina, que pode ser a de outro usuário
+    args = ("-p", "--resume", conversation_id) if conversation_id else ("-p",)
+    args += ("--output-format", "stream-json", "--verbose")
+    if CLAUDE_PARTIAL_MESSAGES:
+        args += ("--include-partial-messages",)
+    return args
+
+class StreamJsonParser:
+    """
+    Interpreta incrementalmente a saída stream-json do Claude CLI.
+    
+    Os dados podem chegar em pedaços de qualquer tamanho; cada evento é
+    decodificado assim que o objeto JSON correspondente termina de chegar.
+    
+    Eventos produzidos:
+        {"type": "session", "session_id": str}
+        {"type": "text", "text": str}
+        {"type": "result", "record": dict}
+    """
+    
+    def __init__(self, conversation_id=None):
+        self.session_id = None
+        self.given_conversation_id = conversation_id
+        self.result = None
+        self._buffer = ""
+        self._decoder = json.JSONDecoder()
+        self._partial_text = False
+        self._text_parts = []
+    
+    @property
+    def conversation_id(self):
+        """ID da sessão informado pelo CLI ou o informado na chamada."""
+        return self.session_id or self.given_conversation_id
+    
+    @property
+    def text(self):
+        """Texto completo recebido até agora."""
+        return "".join(self._text_parts)
+    
+    def feed(self, data):
+        """
+        Processa um pedaço da saída padrão.
         
-        # Se já existe uma conversa, continuar
-        if conversation_id:
-            cmd = f'{CLAUDE_PATH} -c -p "{message}"'
-        else:
-            cmd = f'{CLAUDE_PATH} -p "{message}"'
+        Args:
+            data (str): Texto lido da saída padrão
+            
+        Returns:
+            List[Dict]: Eventos completos contidos nos dados recebidos
+        """
+        self._buffer += data
+        # Um objeto só pode ter terminado se chegou um "}" neste pedaço
+        if "}" not in data:
+            return []
+        
+        events = []
+        buffer = self._buffer
+        pos = 0
+        length = len(buffer)
+        
+        while pos < length:
+            # Pular espaços e quebras de linha entre objetos
+            while pos < length and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos >= length:
+                break
+            
+            try:
+                record, end = self._decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                newline = buffer.find("\n", pos)
+                if newline == -1:
+                    # Objeto incompleto: aguardar mais dados
+                    break
+                # Cada evento ocupa uma linha; descartar a linha inválida
+                logger.debug(f"Linha inválida na saída do Claude CLI: {buffer[pos:newline][:200]}")
+                pos = newline + 1
+                continue
+            
+            pos = end
+            if isinstance(record, dict):
+                events.extend(self._handle(record))
+        
+        self._buffer = buffer[pos:]
+        return events
+    
+    def _handle(self, record):
+        """Converte um registro do CLI nos eventos correspondentes."""
+        events = []
+        record_type = record.get("type")
+        
+        session_id = record.get("session_id")
+        if session_id and not self.session_id:
+            self.session_id = session_id
+            logger.info(f"Sessão do Claude CLI: {session_id}")
+            events.append({"type": "session", "session_id": session_id})
+        
+        if record_type == "stream_event":
+            # Fragmentos de texto (--include-partial-messages)
+            event = record.get("event") or {}
+            delta = event.get("delta") or {}
+            if event.get("type") == "content_block_delta" and delta.get("type") == "text_delta":
+                self._partial_text = True
+                text = delta.get("text", "")
+                if text:
+                    self._text_parts.append(text)
+                    events.append({"type": "text", "text": text})
+        
+        elif record_type == "assistant" and not self._partial_text:
+            # Sem fragmentos, o texto chega na mensagem completa do assistente
+            message = record.get("message") or {}
+            for item in message.get("content") or []:
+                if isinstance(item, dict) and item.get("type") == "text" and item.get("text"):
+                    self._text_parts.append(item["text"])
+                    events.append({"type": "text", "text": item["text"]})
         
-        logger.debug(f"Executando comando: {cmd}")
+        elif record_type == "assistant":
+            # Os fragmentos já foram entregues; a próxima mensagem recomeça a contagem
+            self._partial_text = False
         
-        # Executar comando Claude CLI
-        process = subprocess.Popen(
-            cmd,
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
+        elif record_type == "result":
+            self.result = record
+            events.append({"type": "result", "record": record})
+        
+        return events
+
+class ChunkCoalescer:
+    """
+    Agrupa os fragmentos de texto do streaming antes de entregá-los.
+    
+    O texto acumulado é liberado quando atinge ``flush_bytes`` bytes ou
+    quando o fragmento mais antigo espera há ``flush_ms`` milissegundos,
+    o que ocorrer primeiro. Com os dois limites em 0 cada fragmento é
+    entregue imediatamente.
+    """
+    
+    def __init__(self, flush_ms=CLAUDE_STREAM_FLUSH_MS, flush_bytes=CLAUDE_STREAM_FLUSH_BYTES):
+        self.flush_interval = flush_ms / 1000.0 if flush_ms > 0 else None
+        self.flush_bytes = flush_bytes if flush_bytes > 0 else None
+        self._parts = []
+        self._size = 0
+        self._first_at = None
+    
+    def add(self, text):
+        """
+        Acrescenta um fragmento.
+        
+        Args:
+            text (str): Fragmento de texto recebido
+            
+        Returns:
+            str: Texto a ser entregue agora, ou None se deve continuar acumulando
+        """
+        if not text:
+            return None
+        if self._first_at is None:
+            self._first_at = time.monotonic()
+        self._parts.append(text)
+        self._size += len(text.encode("utf-8"))
+        
+        if self.flush_interval is None and self.flush_bytes is None:
+            return self.flush()
+        if self.flush_bytes is not None and self._size >= self.flush_bytes:
+            return self.flush()
+        if self.is_due():
+            return self.flush()
+        return None
+    
+    def time_until_due(self):
+        """
+        Tempo (em segundos) até o texto acumulado precisar ser entregue.
+        
+        Returns:
+            float: Segundos restantes, ou None se não houver prazo
+        """
+        if self._first_at is None or self.flush_interval is None:
+            return None
+        return max(0.0, self._first_at + self.flush_interval - time.monotonic())
+    
+    def is_due(self):
+        """Indica se o texto acumulado já deve ser entregue."""
+        return self.time_until_due() == 0.0
+    
+    def flush(self):
+        """
+        Retorna e limpa o texto acumulado.
+        
+        Returns:
+            str: Texto acumulado (vazio se não houver nada)
+        """
+        text = "".join(self._parts)
+        self._parts = []
+        self._size = 0
+        self._first_at = None
+        return text
+
+class _CallStats:
+    """
+    Medidas de uma chamada ao Claude CLI, registradas nas métricas ao final.
+    """
+    
+    def __init__(self, bytes_in=0, session_id=None):
+        self.started_at = time.monotonic()
+        self.spawned_at = None
+        self.sent_at = None
+        self.first_byte_at = None
+        # Primeira saída do modelo (texto ou registro final), para o hedging;
+        # o primeiro byte costuma ser o registro system/init do CLI
+        self.first_output_at = None
+        self.bytes_in = bytes_in
+        self.bytes_out = 0
+        self.status = "cancelled"
+        # Sessão da chamada e prazo total aplicado (para o modelo de latência)
+        self.session_id = session_id
+        self.deadline = None
+        self.timeout_kind = None
+        # Uso de recursos do processo filho (amostrado em /proc enquanto roda)
+        self.pid = None
+        self.resources = None
+    
+    def spawned(self, pid=None):
+        """Registra que o processo foi obtido e passa a amostrar seus recursos."""
+        self.spawned_at = time.monotonic()
+        sampler = get_process_sampler()
+        if pid is not None and sampler is not None:
+            sampler.track(pid)
+            self.pid = pid
+    
+    def finish_resources(self):
+        """
+        Faz a última amostra de recursos do processo (antes de recolhê-lo).
+        
+        Returns:
+            dict: Uso de recursos (ver utils.proc_stats.ProcessUsage.as_dict),
+            ou None se o processo não era amostrado
+        """
+        if self.pid is not None and self.resources is None:
+            self.resources = get_process_sampler().finish(self.pid)
+        return self.resources
+    
+    def sent(self):
+        """Registra que o prompt foi enviado."""
+        self.sent_at = time.monotonic()
+    
+    def data_received(self, size):
+        """Registra bytes lidos da saída padrão."""
+        if self.first_byte_at is None:
+            self.first_byte_at = time.monotonic()
+        self.bytes_out += size
+    
+    def output_started(self):
+        """Registra a primeira saída do modelo (texto ou registro final)."""
+        if self.first_output_at is None:
+            self.first_output_at = time.monotonic()
+    
+    def record(self, exit_code=None):
+        """
+        Registra a chamada nas métricas.
+        
+        Args:
+            exit_code (int, opcional): Código de saída do processo; um processo
+                encerrado pela aplicação (SIGKILL) é registrado como "killed" e
+                um que nem chegou a iniciar, como "spawn_failed"
+        """
+        if exit_code == -signal.SIGKILL:
+            exit_code = None
+        sent_at = self.sent_at or self.spawned_at
+        if self.first_output_at and sent_at:
+            _hedger.observe(self.first_output_at - sent_at)
+        
+        # Aprender o prazo com as chamadas concluídas e com as que estouraram o prazo aprendido
+        model = get_latency_model()
+        if model is not None and sent_at:
+            if self.status == "ok":
+                model.observe(self.bytes_in, time.monotonic() - sent_at, self.session_id)
+            elif self.timeout_kind == "prazo aprendido" and self.deadline:
+                model.observe(self.bytes_in, self.deadline, self.session_id, timed_out=True)
+        
+        record_cli_call(
+            self.status, exit_code, time.monotonic() - self.started_at,
+            spawn=self.spawned_at - self.started_at if self.spawned_at else None,
+            first_byte=self.first_byte_at - sent_at if self.first_byte_at and sent_at else None,
+            bytes_in=self.bytes_in, bytes_out=self.bytes_out,
+            resources=self.finish_resources(),
+            started=self.spawned_at is not None
         )
+
+def _result_error(record):
+    """
+    Retorna a mensagem de erro de um registro final, se houver.
+    
+    Args:
+        record (dict): Registro final ("type": "result") do Claude CLI
         
-        # Coletar resposta
-        output, error = process.communicate(timeout=CLAUDE_TIMEOUT)
+    Returns:
+        str: Descrição do erro, ou None se a execução foi bem-sucedida
+    """
+    if not record or not (record.get("is_error") or record.get("subtype", "success") != "success"):
+        return None
+    return record.get("result") or record.get("subtype") or "erro desconhecido"
+
+def _stream_error(parser, error, returncode):
+    """
+    Decide se uma chamada em streaming falhou (mesmos critérios de
+    _parse_output, mais o código de saída do processo).
+    
+    Args:
+        parser (StreamJsonParser): Parser que leu a saída completa
+        error (str): Saída de erro do Claude CLI
+        returncode (int): Código de saída (None se o processo ainda não saiu)
         
-        # Verificar se houve erro ou saída vazia
-        if not output:
-            if error:
-                logger.error(f"Erro ao executar o Claude CLI: {error}")
-                return f"Erro: {error}", None
-            else:
-                logger.error("O Claude CLI não retornou nenhuma resposta")
-                return "Erro: Não foi possível obter resposta do Claude CLI", None
-        
-        # Extrair ID da conversa se for nova
-        if not conversation_id:
-            # Tentar encontrar o ID da conversa no output
-            match = re.search(r'Conversation:\s+(\d+)', output)
-            if match:
-                conversation_id = match.group(1)
-                logger.info(f"Nova conversa iniciada com ID: {conversation_id}")
-        
-        # Limpar a saída para exibir apenas a resposta
-        response = output
-        
-        # Tratamento mais robusto: se tiver o padrão "Conversation: xxxx" seguido por dois \n
-        header_match = re.search(r'^(.*?Conversation:\s+\d+.*?)(\n\n)(.*)', response, flags=re.DOTALL)
-        if header_match:
-            # Ignorar o cabeçalho e pegar apenas a parte da resposta
-            response = header_match.group(3)
+    Returns:
+        str: Descrição do erro, ou None se a chamada foi bem-sucedida
+    """
+    result_error = _result_error(parser.result)
+    if result_error:
+        return result_error
+    if returncode:
+        if error and parser.result is None:
+            return f"O Claude CLI encerrou com código {returncode}: {error}"
+        return f"O Claude CLI encerrou com código {returncode}"
+    if parser.result is None:
+        if error:
+            return error
+        if not parser.text:
+            return "Não foi possível obter resposta do Claude CLI"
+    return None
+
+def _record_usage(record):
+    """
+    Guarda duração, turnos, tokens e custo do registro final no registro de uso.
+    
+    Args:
+        record (dict): Registro final ("type": "result") do Claude CLI
+    """
+    if not record or not CLAUDE_USAGE_ENABLED:
+        return
+    try:
+        get_usage_store().record(record)
+    except Exception as e:
+        logger.error(f"Erro ao registrar o uso da chamada: {str(e)}")
+
+def _call_result(response, conversation_id=None, error=False):
+    """
+    Monta o resultado de uma chamada ao Claude CLI.
+    
+    Args:
+        response (str): Resposta do Claude (ou mensagem "Erro: ...")
+        conversation_id (str, opcional): ID da conversa
+        error (bool): Se a chamada falhou
+        
+    Returns:
+        dict: Resultado da chamada
+    """
+    return {"response": response, "conversation_id": conversation_id, "error": error}
+
+def _parse_output(output, error, conversation_id=None):
+    """
+    Extrai a resposta e o ID da conversa da saída completa do Claude CLI e
+    guarda o registro final no registro de uso.
+    
+    Args:
+        output (str): Saída padrão do Claude CLI (stream-json)
+        error (str): Saída de erro do Claude CLI
+        conversation_id (str, opcional): ID da conversa em andamento
+        
+    Returns:
+        dict: Resultado da chamada (ver _call_result)
+    """
+    parser = StreamJsonParser(conversation_id)
+    parser.feed(output + "\n")
+    _record_usage(parser.result)
+    
+    # Verificar se houve erro ou saída vazia
+    if parser.result is None and not parser.text:
+        if error:
+            logger.error(f"Erro ao executar o Claude CLI: {error}")
+            return _call_result(f"Erro: {error}", error=True)
         else:
-            # Tentar outra abordagem: remover linhas que contenham "Conversation: xxxx"
-            response = re.sub(r'.*Conversation:\s+\d+.*\n', '', response)
+            logger.error("O Claude CLI não retornou nenhuma resposta")
+            return _call_result("Erro: Não foi possível obter resposta do Claude CLI", error=True)
+    
+    result_error = _result_error(parser.result)
+    if result_error:
+        logger.error(f"O Claude CLI retornou erro: {result_error}")
+        return _call_result(f"Erro: {result_error}", parser.conversation_id, error=True)
+    
+    # O registro final traz a resposta completa; os fragmentos são o fallback
+    response = (parser.result or {}).get("result")
+    if not isinstance(response, str):
+        response = parser.text
+    
+    return _call_result(response.strip(), parser.conversation_id)
+
+def _start_claude_process(conversation_id=None):
+    """
+    Obtém um processo do Claude CLI pronto para receber o prompt pela
+    entrada padrão.
+    
+    Com o pool ativo, o processo já está iniciado. Sem o pool, o executável
+    é iniciado diretamente (sem shell) com a lista de argumentos.
+    
+    Args:
+        conversation_id (str, opcional): ID da sessão do Claude CLI a retomar
         
-        return response.strip(), conversation_id
+    Returns:
+        tuple: (processo aguardando o prompt na entrada padrão, se veio
+        aquecido do pool)
+    """
+    args = _cli_args(conversation_id)
     
-    except subprocess.TimeoutExpired:
-        process.kill()
-        logger.error(f"Timeout ao aguardar resposta do Claude (limite: {CLAUDE_TIMEOUT}s)")
-        return "Erro: A resposta demorou muito tempo.", None
-    except Exception as e:
-        logger.exception("Erro inesperado ao comunicar com o Claude CLI")
-        return f"Erro: {str(e)}", None
+    pool = _get_worker_pool()
+    if pool is not None:
+        logger.debug(f"Usando processo do pool: {CLAUDE_PATH} {' '.join(args)}")
+        return pool.acquire(args)
+    
+    logger.debug(f"Executando comando: {CLAUDE_PATH} {' '.join(args)}")
+    return spawn_process((CLAUDE_PATH, *args)), False
 
-def stream_claude_response(message, conversation_id=None):
+# Prompts até este tamanho cabem no buffer do pipe e são escritos sem bloquear
+_STDIN_INLINE_BYTES = 65536
+
+def _send_prompt(process, data):
     """
-    Envia uma mensagem para o Claude Code CLI e retorna a resposta em streaming.
-    Permite integração com Streamlit para exibição gradual da resposta.
+    Escreve o prompt na entrada padrão do processo e a fecha.
+    
+    O início do prompt (até o tamanho do buffer do pipe) é escrito na hora;
+    o restante é escrito por uma thread, para que a leitura da saída comece
+    sem esperar o CLI consumir toda a entrada.
     
     Args:
-        message (str): A mensagem para enviar ao Claude
-        conversation_id (str, opcional): ID da conversa para continuar
+        process (subprocess.Popen): Processo do Claude CLI
+        data (bytes): Prompt codificado em UTF-8
         
-    Yields:
-        tuple: (fragmento_de_resposta, flag_de_finalização, conversation_id)
+    Returns:
+        bool: False se o processo já havia encerrado sem ler a entrada
+    """
+    def write(chunk, close):
+        try:
+            process.stdin.write(chunk)
+            if close:
+                process.stdin.close()
+            else:
+                process.stdin.flush()
+            return True
+        except (BrokenPipeError, ValueError, OSError) as e:
+            # O processo encerrou antes de ler o prompt; o erro aparece na saída
+            logger.debug(f"Não foi possível enviar o prompt ao Claude CLI: {str(e)}")
+            return False
+    
+    if len(data) <= _STDIN_INLINE_BYTES:
+        return write(data, close=True)
+    if not write(data[:_STDIN_INLINE_BYTES], close=False):
+        return False
+    threading.Thread(target=write, args=(data[_STDIN_INLINE_BYTES:], True),
+                     name="claude-stdin-writer", daemon=True).start()
+    return True
+
+_BUSY_MESSAGE = "O Claude está ocupado no momento. Tente novamente em instantes."
+
+class CircuitBreaker:
+    """
+    Interrompe as chamadas ao Claude CLI enquanto ele estiver falhando.
+    
+    Fechado, as chamadas passam normalmente. Após ``failure_threshold``
+    falhas seguidas ele abre e recusa as chamadas imediatamente durante
+    ``cooldown`` segundos. Em seguida fica semiaberto: uma única chamada de
+    teste passa; se ela der certo o circuito fecha, senão volta a abrir.
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    STATES = (CLOSED, OPEN, HALF_OPEN)
+    
+    def __init__(self, failure_threshold, cooldown):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+        self.opened = 0
+        self.rejected = 0
+    
+    def _current_state(self):
+        """Estado atual, passando de aberto a semiaberto após o cool-down."""
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+    
+    def allow(self):
+        """
+        Verifica se uma chamada pode ser feita agora.
+        
+        Returns:
+            bool: False se o circuito está aberto (ou já há uma chamada de teste)
+        """
+        if not self.failure_threshold:
+            return True
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                logger.info("Circuit breaker semiaberto: enviando chamada de teste ao Claude CLI")
+                return True
+            self.rejected += 1
+            return False
+    
+    def record_success(self):
+        """Registra uma chamada bem-sucedida."""
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("Circuit breaker fechado: o Claude CLI voltou a responder")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+    
+    def record_failure(self):
+        """Registra uma chamada que falhou (erro ou timeout)."""
+        if not self.failure_threshold:
+            return
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or (self._state == self.CLOSED
+                                                 and self._failures >= self.failure_threshold):
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+                self.opened += 1
+                logger.warning(f"Circuit breaker aberto após {self._failures} falhas seguidas; "
+                               f"chamadas recusadas por {self.cooldown}s")
+    
+    def release(self):
+        """Libera a chamada de teste que terminou sem resultado (ex.: cancelada)."""
+        with self._lock:
+            self._probe_in_flight = False
+    
+    def state(self):
+        """
+        Retorna o estado do circuito.
+        
+        Returns:
+            dict: Estado, falhas seguidas, segundos até a próxima chamada de
+            teste (quando aberto) e contadores
+        """
+        with self._lock:
+            state = self._current_state()
+            retry_in = None
+            if state == self.OPEN:
+                retry_in = max(0.0, self._opened_at + self.cooldown - time.monotonic())
+            return {
+                "state": state,
+                "failures": self._failures,
+                "retry_in": retry_in,
+                "opened": self.opened,
+                "rejected": self.rejected
+            }
+
+_circuit_breaker = CircuitBreaker(CLAUDE_BREAKER_FAILURES, CLAUDE_BREAKER_COOLDOWN)
+
+def get_circuit_breaker_state():
+    """
+    Retorna o estado do circuit breaker do Claude CLI (para a interface e
+    as métricas).
+    
+    Returns:
+        dict: Ver CircuitBreaker.state()
+    """
+    return _circuit_breaker.state()
+
+def _unavailable_message():
+    """Mensagem de erro para chamadas recusadas pelo circuit breaker."""
+    retry_in = _circuit_breaker.state()["retry_in"]
+    if retry_in:
+        return f"O Claude CLI está indisponível no momento. Tente novamente em {int(retry_in) + 1}s."
+    return "O Claude CLI está indisponível no momento. Tente novamente em instantes."
+
+class _SessionLocks:
+    """
+    Garante a ordem das chamadas dentro de cada sessão do Claude CLI.
+    
+    Chamadas da mesma sessão são executadas uma de cada vez, na ordem de
+    chegada ao lock; sessões diferentes rodam em paralelo. Os locks são
+    descartados quando ninguém mais os usa.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}
+    
+    @contextmanager
+    def hold(self, session_id):
+        """
+        Aguarda a vez da chamada na sessão.
+        
+        Args:
+            session_id (str): ID da sessão (None não serializa nada)
+        """
+        if not session_id:
+            yield
+            return
+        
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                entry = self._sessions[session_id] = [threading.Lock(), 0]
+            entry[1] += 1
+        
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._sessions[session_id]
+
+_session_locks = _SessionLocks()
+
+def _call_claude(message, conversation_id=None, user_id=None, lane="interactive"):
+    """
+    Aguarda uma vaga no controle de admissão e executa a chamada.
+    
+    Args:
+        message (str): O prompt completo para enviar ao Claude
+        conversation_id (str, opcional): ID da sessão do Claude CLI a retomar
+        user_id (str, opcional): Usuário que fez o pedido (para o rodízio da fila)
+        lane (str): Fila de prioridade ("interactive" ou "batch")
+        
+    Returns:
+        dict: Resultado da chamada (ver _call_result)
     """
+    # Com o CLI falhando, responder na hora em vez de esperar o timeout
+    if not _circuit_breaker.allow():
+        return _call_result(f"Erro: {_unavailable_message()}", error=True)
+    
     try:
-        # Escapar aspas duplas no input para evitar problemas no shell
-        message = message.replace('"', '\\"')
+        # Aguardar a chamada anterior da mesma sessão antes de ocupar uma vaga
+        with _session_locks.hold(conversation_id), get_scheduler().slot(user_id, lane):
+            result = _run_claude(message, conversation_id, user_id, lane)
+    except QueueTimeout as e:
+        _circuit_breaker.release()
+        logger.warning(f"Pedido recusado pelo controle de admissão: {str(e)}")
+        return _call_result(f"Erro: {_BUSY_MESSAGE}", error=True)
+    except BaseException:
+        _circuit_breaker.release()
+        raise
+    
+    if result["error"]:
+        _circuit_breaker.record_failure()
+    else:
+        _circuit_breaker.record_success()
+    return result
+
+class _Hedger:
+    """
+    Decide quando duplicar uma chamada lenta (hedging).
+    
+    Guarda os tempos recentes até a primeira saída do modelo (texto ou
+    registro final, não o system/init que o CLI envia ao iniciar); uma
+    chamada que passa do p95 sem saída do modelo ganha uma cópia, desde que
+    as cópias não passem de ``max_percent`` por cento das chamadas avaliadas.
+    """
+    
+    def __init__(self, max_percent, min_samples):
+        self.max_percent = max_percent
+        self.min_samples = max(1, min_samples)
+        self._first_outputs = deque(maxlen=500)
+        self._lock = threading.Lock()
+        self.eligible = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+    
+    def observe(self, first_output):
+        """Registra o tempo até a primeira saída do modelo em uma chamada."""
+        with self._lock:
+            self._first_outputs.append(first_output)
+    
+    def start_call(self):
+        """
+        Registra uma chamada avaliada e retorna quanto esperar pela primeira
+        saída do modelo antes de duplicá-la (p95 observado).
         
-        # Se já existe uma conversa, continuar
-        if conversation_id:
-            cmd = f'{CLAUDE_PATH} -c -p "{message}"'
-        else:
-            cmd = f'{CLAUDE_PATH} -p "{message}"'
-        
-        logger.debug(f"Executando comando streaming: {cmd}")
-        
-        # Executar comando Claude CLI
-        process = subprocess.Popen(
-            cmd,
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1
-        )
+        Returns:
+            float: Segundos, ou None se ainda não há medidas suficientes
+        """
+        with self._lock:
+            self.eligible += 1
+            if len(self._first_outputs) < self.min_samples:
+                return None
+            values = sorted(self._first_outputs)
+            return values[int(len(values) * 0.95)]
+    
+    def try_hedge(self):
+        """Reserva uma cópia se o limite de porcentagem permitir."""
+        with self._lock:
+            if (self.hedged + 1) * 100 > self.eligible * self.max_percent:
+                return False
+            self.hedged += 1
+            return True
+    
+    def won(self):
+        """Registra que a cópia respondeu antes da chamada original."""
+        with self._lock:
+            self.hedge_wins += 1
+    
+    def stats(self):
+        """Retorna os contadores e o p95 atual do tempo até a primeira saída do modelo."""
+        with self._lock:
+            values = sorted(self._first_outputs)
+            return {
+                "eligible": self.eligible,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "first_output_p95": values[int(len(values) * 0.95)] if values else None
+            }
+
+_hedger = _Hedger(CLAUDE_HEDGE_MAX_PERCENT, CLAUDE_HEDGE_MIN_SAMPLES)
+
+def get_hedging_stats():
+    """
+    Retorna os contadores de hedging.
+    
+    Returns:
+        dict: Chamadas avaliadas, cópias iniciadas, cópias vencedoras e o p95
+        atual do tempo até a primeira saída do modelo
+    """
+    return _hedger.stats()
+
+def _cancel_attempt(attempt):
+    """Interrompe uma tentativa de chamada encerrando o seu processo."""
+    attempt["stop"].set()
+    process = attempt["process"]
+    # poll() recolhe o processo se já terminou; só encerrar o grupo se ainda existir
+    if process is not None and process.poll() is None:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+def _events(message, conversation_id=None, coalesce=True, user_id=None, lane="interactive"):
+    """
+    Executa a chamada, com hedging quando ativo e a chamada não tem conversa.
+    
+    Uma cópia de uma chamada em uma conversa existente continuaria a mesma
+    sessão duas vezes, por isso só prompts sem conversa são duplicados. A
+    cópia ocupa a sua própria vaga no controle de admissão (do mesmo usuário
+    e fila) e só é iniciada se houver uma livre, sem esperar na fila.
+    
+    Vence a primeira tentativa com saída do modelo (texto ou registro final);
+    os eventos anteriores (sessão, diagnósticos) ficam guardados por
+    tentativa e só os da vencedora são repassados. Uma tentativa que termina
+    sem saída só vence se não restar outra em andamento.
+    """
+    if not CLAUDE_HEDGING or conversation_id:
+        yield from _stream_events(message, conversation_id, coalesce)
+        return
+    
+    delay = _hedger.start_call()
+    if delay is None:
+        yield from _stream_events(message, None, coalesce)
+        return
+    
+    events = queue.Queue()
+    attempts = []
+    
+    def start_attempt(ticket=None):
+        index = len(attempts)
+        attempt = {"process": None, "stop": threading.Event()}
+        attempts.append(attempt)
         
-        # Variáveis para controle de streaming
-        detected_conversation_id = None
-        response_started = False
-        complete_output = ""
-        buffer = ""
+        def on_process(process):
+            attempt["process"] = process
+            if attempt["stop"].is_set():
+                _cancel_attempt(attempt)
         
-        # Ler saída linha por linha para um streaming suave
-        for line in iter(process.stdout.readline, ''):
-            complete_output += line
+        def produce():
+            generator = _stream_events(message, None, coalesce, on_process)
+            try:
+                for event in generator:
+                    if attempt["stop"].is_set():
+                        break
+                    events.put((index, event))
+            finally:
+                generator.close()
+                if ticket is not None:
+                    get_scheduler().release(ticket)
+                events.put((index, None))
+        
+        threading.Thread(target=produce, name=f"claude-hedge-{index}", daemon=True).start()
+    
+    start_attempt()
+    hedge_at = time.monotonic() + delay
+    winner = None
+    pending = {}
+    finished = set()
+    
+    try:
+        while True:
+            timeout = None
+            if winner is None and hedge_at is not None:
+                timeout = max(0.0, hedge_at - time.monotonic())
+            try:
+                index, event = events.get(timeout=timeout)
+            except queue.Empty:
+                hedge_at = None
+                # A cópia precisa de uma vaga livre (sem esperar nem furar a fila)
+                ticket = get_scheduler().try_acquire(user_id, lane)
+                if ticket is None:
+                    continue
+                if not _hedger.try_hedge():
+                    get_scheduler().release(ticket)
+                    continue
+                logger.debug(f"Sem resposta após {delay:.2f}s (p95): iniciando chamada duplicada")
+                start_attempt(ticket)
+                continue
             
-            # Verificar se encontramos o ID da conversa
-            if not detected_conversation_id and not conversation_id:
-                match = re.search(r'Conversation:\s+(\d+)', line)
-                if match:
-                    detected_conversation_id = match.group(1)
-                    logger.info(f"Nova conversa streaming iniciada com ID: {detected_conversation_id}")
+            if winner is None:
+                if event is not None and event["type"] not in ("text", "result"):
+                    pending.setdefault(index, []).append(event)
+                    continue
+                if event is None:
+                    finished.add(index)
+                    if len(finished) < len(attempts):
+                        # Terminou sem saída do modelo enquanto outra tentativa segue
+                        pending.pop(index, None)
+                        continue
+                
+                # A primeira tentativa com saída do modelo vence; as demais são encerradas
+                winner = index
+                for other, attempt in enumerate(attempts):
+                    if other != winner:
+                        _cancel_attempt(attempt)
+                if winner > 0:
+                    _hedger.won()
+                yield from pending.pop(index, [])
             
-            # Ignorar linha se contiver informações de cabeçalho
-            if re.search(r'Conversation:\s+\d+', line):
+            if index != winner:
                 continue
+            if event is None:
+                return
+            yield event
+    finally:
+        for attempt in attempts:
+            _cancel_attempt(attempt)
+
+def _run_claude(message, conversation_id=None, user_id=None, lane="interactive"):
+    """
+    Executa uma chamada ao Claude CLI e aguarda a resposta completa.
+    
+    Args:
+        message (str): O prompt completo para enviar ao Claude
+        conversation_id (str, opcional): ID da sessão do Claude CLI a retomar
+        user_id (str, opcional): Usuário que fez o pedido (vaga de uma cópia de hedging)
+        lane (str): Fila de prioridade (vaga de uma cópia de hedging)
+        
+    Returns:
+        dict: Resultado da chamada (ver _call_result)
+    """
+    session_id = None
+    record = None
+    parts = []
+    
+    # Mesmo leitor do streaming, com os mesmos limites de tempo
+    for event in _events(message, conversation_id, coalesce=False, user_id=user_id, lane=lane):
+        if event["type"] == "session":
+            session_id = event["session_id"]
+        elif event["type"] == "text":
+            parts.append(event["text"])
+        elif event["type"] == "result":
+            record = event["record"]
+        elif event["type"] == "error":
+            return _call_result(f"Erro: {event['error']}", error=True)
+    
+    if record is None and not parts:
+        logger.error("O Claude CLI não retornou nenhuma resposta")
+        return _call_result("Erro: Não foi possível obter resposta do Claude CLI", error=True)
+    
+    # O registro final traz a resposta completa; os fragmentos são o fallback
+    response = (record or {}).get("result")
+    if not isinstance(response, str):
+        response = "".join(parts)
+    
+    return _call_result(response.strip(), session_id or conversation_id)
+
+class _StreamFlight:
+    """
+    Eventos de uma chamada em streaming compartilhada entre consumidores.
+    
+    Os eventos ficam guardados para que quem chegar depois também receba a
+    resposta desde o início.
+    """
+    
+    def __init__(self):
+        self.events = []
+        self.finished = False
+        self.subscribers = 0
+        self.cond = threading.Condition()
+    
+    def publish(self, event):
+        with self.cond:
+            self.events.append(event)
+            self.cond.notify_all()
+    
+    def finish(self):
+        with self.cond:
+            self.finished = True
+            self.cond.notify_all()
+    
+    def abandoned(self):
+        """Indica se todos os consumidores desistiram da resposta."""
+        with self.cond:
+            return self.subscribers == 0
+    
+    def subscribe(self):
+        """
+        Entrega os eventos publicados, aguardando os próximos.
+        
+        Yields:
+            dict: Eventos da chamada (ver stream_claude_events)
+        """
+        index = 0
+        try:
+            while True:
+                with self.cond:
+                    while index >= len(self.events) and not self.finished:
+                        self.cond.wait()
+                    pending = self.events[index:]
+                    index = len(self.events)
+                    finished = self.finished
                 
-            # Checar se é uma linha em branco que indica o início da resposta
-            if not response_started and line.strip() == "":
-                response_started = True
+                for event in pending:
+                    yield event
+                
+                if finished and index >= len(self.events):
+                    return
+        finally:
+            with self.cond:
+                self.subscribers -= 1
+
+class _SingleFlight:
+    """
+    Agrupa chamadas idênticas simultâneas em uma única execução do Claude CLI.
+    
+    Enquanto uma chamada está em andamento, pedidos com a mesma chave
+    aguardam e recebem o mesmo resultado (ou os mesmos fragmentos, no
+    streaming) em vez de iniciar outro processo.
+    
+    Usado apenas para chamadas que iniciam uma conversa: a sessão criada
+    fica só com quem iniciou a chamada; os demais recebem a resposta sem
+    sessão, como uma resposta do cache.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._streams = {}
+        self.shared = 0
+    
+    def do(self, key, fn):
+        """
+        Executa fn() uma única vez por chave entre chamadas simultâneas.
+        
+        Args:
+            key: Identificador da chamada
+            fn (callable): Função que executa a chamada
+            
+        Returns:
+            tuple: (resultado de fn(), compartilhado entre os participantes;
+            se esta chamada foi a que executou fn())
+        """
+        with self._lock:
+            flight = self._calls.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._calls[key] = {"done": threading.Event(), "result": None, "error": None}
+            else:
+                self.shared += 1
+        
+        if not leader:
+            flight["done"].wait()
+            if flight["error"] is not None:
+                raise flight["error"]
+            return flight["result"], False
+        
+        try:
+            flight["result"] = fn()
+            return flight["result"], True
+        except Exception as e:
+            flight["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            flight["done"].set()
+    
+    def stream(self, key, factory):
+        """
+        Compartilha os eventos de uma chamada em streaming entre consumidores.
+        
+        O primeiro consumidor inicia a chamada em uma thread produtora; os
+        demais recebem os mesmos eventos. Se todos os consumidores desistirem,
+        a chamada é interrompida.
+        
+        Args:
+            key: Identificador da chamada
+            factory (callable): Cria o gerador de eventos da chamada
+            
+        Returns:
+            tuple: (gerador com os eventos da chamada para este consumidor,
+            se este consumidor iniciou a chamada)
+        """
+        with self._lock:
+            flight = self._streams.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._streams[key] = _StreamFlight()
+            else:
+                self.shared += 1
+            with flight.cond:
+                flight.subscribers += 1
+        
+        if leader:
+            threading.Thread(target=self._produce, args=(key, flight, factory),
+                             name="claude-single-flight", daemon=True).start()
+        
+        return flight.subscribe(), leader
+    
+    def _produce(self, key, flight, factory):
+        """Executa a chamada e publica os eventos para os consumidores."""
+        events = factory()
+        try:
+            for event in events:
+                flight.publish(event)
+                if flight.abandoned():
+                    logger.debug("Streaming interrompido: nenhum consumidor aguardando")
+                    break
+        except Exception as e:
+            logger.exception("Erro inesperado durante o streaming compartilhado")
+            flight.publish({"type": "error", "error": str(e)})
+        finally:
+            events.close()
+            with self._lock:
+                if self._streams.get(key) is flight:
+                    del self._streams[key]
+            flight.finish()
+
+_single_flight = _SingleFlight()
+
+metrics_registry.register_collector(_collect_metrics)
+
+def get_single_flight_stats():
+    """
+    Retorna quantas chamadas aproveitaram uma execução já em andamento.
+    
+    Returns:
+        dict: Chamadas compartilhadas e execuções em andamento
+    """
+    with _single_flight._lock:
+        return {
+            "shared": _single_flight.shared,
+            "in_flight": len(_single_flight._calls) + len(_single_flight._streams)
+        }
+
+def build_prompt(message, context=None):
+    """
+    Monta o prompt enviado ao Claude, com o contexto da memória do usuário.
+    
+    Args:
+        message (str): Mensagem do usuário
+        context (str, opcional): Contexto (ver build_context() no app)
+        
+    Returns:
+        str: Prompt completo
+    """
+    if context:
+        return f"[CONTEXTO: {context}]\n\n{message}"
+    return message
+
+def _cache_enabled(use_cache):
+    """Decide se o cache de respostas participa da chamada."""
+    return CLAUDE_CACHE_ENABLED if use_cache is None else use_cache
+
+def _cache_key(message, context, conversation_id):
+    """
+    Chave do cache de respostas para a chamada.
+    
+    Apenas prompts que iniciam uma conversa são cacheados: a resposta de uma
+    sessão retomada depende do histórico dela, e servi-la do cache deixaria a
+    sessão do CLI sem o turno que o usuário viu.
+    
+    Returns:
+        str: Chave do cache, ou None se a chamada não pode usar o cache
+    """
+    if conversation_id:
+        return None
+    return get_response_cache().make_key(message, context, "new")
+
+def _single_flight_enabled(use_single_flight, conversation_id):
+    """Decide se a chamada pode ser compartilhada (só as que iniciam conversa)."""
+    enabled = CLAUDE_SINGLE_FLIGHT if use_single_flight is None else use_single_flight
+    return enabled and not conversation_id
+
+def send_to_claude(message, conversation_id=None, context=None, use_cache=None,
+                   user_id=None, lane="interactive", use_single_flight=None):
+    """
+    Envia uma mensagem para o Claude Code CLI e processa a resposta.
+    
+    Args:
+        message (str): A mensagem para enviar ao Claude
+        conversation_id (str, opcional): ID da sessão do Claude CLI a retomar
+        context (str, opcional): Contexto da memória do usuário, incluído no prompt
+        use_cache (bool, opcional): Usar o cache de respostas; None segue
+            CLAUDE_CACHE_ENABLED e False ignora o cache. Só vale para
+            prompts sem conversation_id, e uma resposta do cache não pertence
+            a nenhuma sessão (conversation_id None): não use o cache se a
+            conversa vai continuar
+        user_id (str, opcional): Usuário que fez o pedido (ex.: session_id do
+            Streamlit), para o rodízio justo na fila de admissão
+        lane (str): Fila de prioridade ("interactive" ou "batch")
+        use_single_flight (bool, opcional): Compartilhar o processo com pedidos
+            idênticos simultâneos; None segue CLAUDE_SINGLE_FLIGHT. Só vale
+            para prompts sem conversation_id, e quem recebe a resposta de
+            outra chamada não recebe sessão (conversation_id None), como no cache
+        
+    Returns:
+        tuple: (resposta, conversation_id)
+    """
+    cache_key = _cache_key(message, context, conversation_id) if _cache_enabled(use_cache) else None
+    if cache_key:
+        cached = get_response_cache().get(cache_key)
+        if cached is not None:
+            logger.debug("Resposta servida pelo cache")
+            return cached, conversation_id
+    
+    def call():
+        result = _call_claude(build_prompt(message, context), conversation_id, user_id, lane)
+        if cache_key and not result["error"]:
+            get_response_cache().set(cache_key, result["response"])
+        return result
+    
+    # Pedidos idênticos simultâneos que iniciam conversa compartilham um único
+    # processo; a sessão criada fica só com quem iniciou a chamada
+    if _single_flight_enabled(use_single_flight, conversation_id):
+        result, leader = _single_flight.do((message, context), call)
+        if not leader:
+            return result["response"], None
+    else:
+        result = call()
+    
+    return result["response"], result["conversation_id"]
+
+class CallTimeout(Exception):
+    """Um dos limites de tempo da chamada foi ultrapassado."""
+    
+    def __init__(self, kind, limit):
+        super().__init__(f"{kind} ({limit}s)")
+        self.kind = kind
+        self.limit = limit
+
+class _Deadlines:
+    """
+    Limites de tempo de uma chamada: primeira saída do modelo, inatividade,
+    prazo total e prazo aprendido (só até a primeira saída do modelo).
+    
+    A primeira saída é o primeiro texto ou registro final, não o primeiro
+    byte: o registro system/init do CLI chega logo após a inicialização e
+    não indica que o modelo começou a responder.
+    """
+    
+    @classmethod
+    def for_call(cls, prompt_bytes, conversation_id=None):
+        """
+        Limites de uma chamada. Com os prazos adaptativos ativos, o prazo do
+        modelo de latência substitui o prazo total, mas só vale até a
+        primeira saída do modelo: uma resposta em andamento não é cortada.
+        
+        Args:
+            prompt_bytes (int): Tamanho do prompt em bytes
+            conversation_id (str, opcional): Sessão retomada pela chamada
+        """
+        model = get_latency_model()
+        if model is None:
+            return cls()
+        return cls(total=None, until_output=model.deadline(prompt_bytes, conversation_id))
+    
+    def __init__(self, first_byte=CLAUDE_FIRST_BYTE_TIMEOUT, idle=CLAUDE_IDLE_TIMEOUT,
+                 total=CLAUDE_TIMEOUT, until_output=None):
+        self.first_byte = first_byte or None
+        self.idle = idle or None
+        self.total = total or None
+        self.until_output = until_output or None
+        self.started_at = time.monotonic()
+        self.last_data_at = None
+        self.output_at = None
+    
+    @property
+    def limit(self):
+        """Prazo que encerra a chamada (aprendido ou total), para o registro."""
+        return self.until_output or self.total
+    
+    def data_received(self):
+        """Registra a chegada de dados na saída."""
+        self.last_data_at = time.monotonic()
+    
+    def output_started(self):
+        """Registra a primeira saída do modelo (texto ou registro final)."""
+        if self.output_at is None:
+            self.output_at = time.monotonic()
+    
+    def _limits(self):
+        """Prazos aplicáveis agora: (tipo, limite, instante em que expira)."""
+        limits = []
+        if self.total:
+            limits.append(("prazo total", self.total, self.started_at + self.total))
+        if self.until_output and self.output_at is None:
+            limits.append(("prazo aprendido", self.until_output, self.started_at + self.until_output))
+        if self.output_at is None and self.first_byte:
+            limits.append(("primeira saída", self.first_byte, self.started_at + self.first_byte))
+        if self.output_at is not None and self.idle:
+            last_activity = max(self.output_at, self.last_data_at or self.output_at)
+            limits.append(("inatividade", self.idle, last_activity + self.idle))
+        return limits
+    
+    def remaining(self):
+        """
+        Tempo até o próximo prazo expirar.
+        
+        Returns:
+            float: Segundos restantes, ou None se não houver limite
+        """
+        limits = self._limits()
+        if not limits:
+            return None
+        return max(0.0, min(expires for _, _, expires in limits) - time.monotonic())
+    
+    def check(self):
+        """
+        Verifica os prazos.
+        
+        Raises:
+            CallTimeout: Se algum limite foi ultrapassado
+        """
+        now = time.monotonic()
+        for kind, limit, expires in self._limits():
+            if now >= expires:
+                raise CallTimeout(kind, limit)
+
+class _StderrBuffer:
+    """
+    Guarda a saída de erro do Claude CLI em um buffer circular limitado.
+    
+    Mantém apenas as últimas linhas até ``max_bytes`` bytes (um CLI com logs
+    detalhados pode escrever muito na saída de erro) e separa as linhas
+    completas para serem repassadas como diagnósticos à medida que chegam,
+    também até ``max_bytes`` bytes por chamada.
+    """
+    
+    def __init__(self, max_bytes=CLAUDE_STDERR_MAX_BYTES):
+        self.max_bytes = max(1024, max_bytes)
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._lines = deque()
+        self._size = 0
+        self._partial = ""
+        self._pending = []
+        self._forwarded = 0
+        self.dropped_bytes = 0
+    
+    def feed(self, data, final=False):
+        """
+        Acrescenta dados lidos da saída de erro.
+        
+        Args:
+            data (bytes): Dados lidos
+            final (bool): Se a saída de erro terminou (libera a linha incompleta)
+        """
+        text = self._partial + self._decoder.decode(data, final=final)
+        lines = text.split("\n")
+        self._partial = "" if final else lines.pop()
+        # Uma linha sem fim maior que o buffer é entregue em partes
+        if len(self._partial) > self.max_bytes:
+            lines.append(self._partial)
+            self._partial = ""
+        
+        for line in lines:
+            line = line.rstrip("\r")
+            if not line:
                 continue
+            line = line[:self.max_bytes]
+            if self._forwarded < self.max_bytes:
+                self._pending.append(line)
+                self._forwarded += len(line) + 1
+            self._lines.append(line)
+            self._size += len(line) + 1
+            while self._size > self.max_bytes and self._lines:
+                removed = self._lines.popleft()
+                self._size -= len(removed) + 1
+                self.dropped_bytes += len(removed) + 1
+    
+    def has_lines(self):
+        """Indica se há linhas ainda não retiradas por take_lines()."""
+        return bool(self._pending)
+    
+    def take_lines(self):
+        """Retorna as linhas completas recebidas desde a última chamada."""
+        lines, self._pending = self._pending, []
+        return lines
+    
+    def text(self):
+        """Últimas linhas da saída de erro (com aviso se houve descarte)."""
+        text = "\n".join(self._lines).strip()
+        if self.dropped_bytes:
+            text = f"[... {self.dropped_bytes} bytes omitidos]\n{text}"
+        return text
+
+# Tempo para terminar de ler a saída de erro depois que a saída padrão fechou
+_STDERR_GRACE_SECONDS = 1.0
+
+def _read_output(process, next_timeout=None, deadlines=None, stats=None, stderr=None):
+    """
+    Lê a saída padrão do processo em pedaços brutos, sem esperar por linhas.
+    
+    A saída de erro é lida ao mesmo tempo: se ficasse sem leitura, um CLI que
+    escreve muito nela encheria o buffer do pipe e travaria a resposta.
+    
+    Args:
+        process (subprocess.Popen): Processo do Claude CLI
+        next_timeout (callable, opcional): Retorna quantos segundos aguardar
+            por dados (None para aguardar indefinidamente)
+        deadlines (_Deadlines, opcional): Limites de tempo da chamada
+        stats (_CallStats, opcional): Medidas da chamada
+        stderr (_StderrBuffer, opcional): Destino da saída de erro (descartada
+            se não informado)
+        
+    Yields:
+        str: Texto decodificado de cada pedaço lido, ou "" quando o prazo
+        de espera terminou sem dados ou chegaram dados só na saída de erro
+        
+    Raises:
+        CallTimeout: Se algum limite de tempo foi ultrapassado
+    """
+    # Decodificador incremental: um caractere UTF-8 pode chegar dividido entre leituras
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    stdout_fd = process.stdout.fileno()
+    stderr_fd = process.stderr.fileno()
+    selector = selectors.DefaultSelector()
+    selector.register(stdout_fd, selectors.EVENT_READ)
+    selector.register(stderr_fd, selectors.EVENT_READ)
+    stdout_open = stderr_open = True
+    grace_until = None
+    
+    try:
+        while stdout_open or stderr_open:
+            if stdout_open:
+                timeouts = [next_timeout() if next_timeout else None,
+                            deadlines.remaining() if deadlines else None]
+                timeouts = [t for t in timeouts if t is not None]
+                timeout = min(timeouts) if timeouts else None
+            else:
+                # Saída padrão encerrada: só aguardar o restante da saída de erro
+                timeout = grace_until - time.monotonic()
+                if timeout <= 0:
+                    break
+            
+            ready = selector.select(timeout)
+            if not ready:
+                if stdout_open:
+                    if deadlines:
+                        deadlines.check()
+                    yield ""
+                continue
+            
+            for key, _ in ready:
+                data = os.read(key.fd, 65536)
+                
+                if key.fd == stderr_fd:
+                    if not data:
+                        stderr_open = False
+                        selector.unregister(stderr_fd)
+                    if stderr is not None:
+                        stderr.feed(data, final=not data)
+                    continue
+                
+                if not data:
+                    stdout_open = False
+                    selector.unregister(stdout_fd)
+                    grace_until = time.monotonic() + _STDERR_GRACE_SECONDS
+                    continue
+                if deadlines:
+                    deadlines.data_received()
+                if stats:
+                    stats.data_received(len(data))
+                text = decoder.decode(data)
+                if text:
+                    yield text
+            
+            if stdout_open and stderr is not None and stderr.has_lines():
+                yield ""
+    finally:
+        selector.close()
+    
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+def stream_claude_events(message, conversation_id=None, user_id=None, lane="interactive"):
+    """
+    Envia uma mensagem para o Claude Code CLI e retorna os eventos da resposta
+    à medida que chegam.
+    
+    Os eventos de texto são agrupados conforme CLAUDE_STREAM_FLUSH_MS e
+    CLAUDE_STREAM_FLUSH_BYTES (ver ChunkCoalescer).
+    
+    É a única interface que entrega o uso de recursos de cada chamada
+    (evento "resources"); send_to_claude e stream_claude_response só o
+    registram nas métricas.
+    
+    Args:
+        message (str): A mensagem para enviar ao Claude
+        conversation_id (str, opcional): ID da sessão do Claude CLI a retomar
+        user_id (str, opcional): Usuário que fez o pedido (para o rodízio da fila)
+        lane (str): Fila de prioridade ("interactive" ou "batch")
+        
+    Yields:
+        dict: Eventos "session", "text" e "result" (ver StreamJsonParser),
+        {"type": "diagnostic", "text": str} para cada linha da saída de erro,
+        {"type": "resources", "resources": dict} com o uso de recursos do
+        processo (ver utils.proc_stats) e {"type": "error", "error": str} em
+        caso de falha
+    """
+    # Com o CLI falhando, responder na hora em vez de esperar o timeout
+    if not _circuit_breaker.allow():
+        yield {"type": "error", "error": _unavailable_message()}
+        return
+    
+    failed = False
+    try:
+        # Aguardar a chamada anterior da mesma sessão antes de ocupar uma vaga
+        with _session_locks.hold(conversation_id), get_scheduler().slot(user_id, lane):
+            for event in _events(message, conversation_id, user_id=user_id, lane=lane):
+                if event["type"] == "error":
+                    failed = True
+                yield event
+    except QueueTimeout as e:
+        _circuit_breaker.release()
+        logger.warning(f"Pedido recusado pelo controle de admissão: {str(e)}")
+        yield {"type": "error", "error": _BUSY_MESSAGE}
+        return
+    except BaseException:
+        # Consumidor desistiu (GeneratorExit) ou erro inesperado: sem veredito
+        _circuit_breaker.release()
+        raise
+    
+    if failed:
+        _circuit_breaker.record_failure()
+    else:
+        _circuit_breaker.record_success()
+
+def _stream_events(message, conversation_id=None, coalesce=True, on_process=None):
+    """
+    Executa a chamada em streaming (ver stream_claude_events).
+    
+    Args:
+        message (str): O prompt completo para enviar ao Claude
+        conversation_id (str, opcional): ID da sessão do Claude CLI a retomar
+        coalesce (bool): Agrupar os fragmentos de texto (ver ChunkCoalescer)
+        on_process (callable, opcional): Recebe o processo assim que é obtido
+    """
+    process = None
+    prompt = message.encode("utf-8")
+    stats = _CallStats(len(prompt), conversation_id)
+    try:
+        # Obter processo do Claude CLI (aquecido pelo pool quando disponível)
+        process, warm = _start_claude_process(conversation_id)
+        stats.spawned(process.pid)
+        if on_process:
+            on_process(process)
+        
+        # O prompt vai pela entrada padrão: sem limite de tamanho da linha de comando
+        if not _send_prompt(process, prompt) and warm:
+            # O processo aquecido desistiu de esperar o prompt: partida a frio
+            logger.info("Processo do pool encerrou antes de ler o prompt, iniciando a frio")
+            kill_process_group(process)
+            stats.finish_resources()
+            pool = _get_worker_pool()
+            pool.record_warm_failure()
+            process = pool.spawn_cold((CLAUDE_PATH, *_cli_args(conversation_id)))
+            stats.resources = None
+            stats.spawned(process.pid)
+            if on_process:
+                on_process(process)
+            _send_prompt(process, prompt)
+        stats.sent()
+        
+        parser = StreamJsonParser(conversation_id)
+        coalescer = ChunkCoalescer() if coalesce else ChunkCoalescer(0, 0)
+        deadlines = _Deadlines.for_call(len(prompt), conversation_id)
+        stats.deadline = deadlines.limit
+        stderr = _StderrBuffer()
+        
+        for text in _read_output(process, coalescer.time_until_due, deadlines, stats, stderr):
+            # Repassar a saída de erro como diagnóstico assim que chega
+            for line in stderr.take_lines():
+                logger.debug(f"Claude CLI (stderr): {line}")
+                yield {"type": "diagnostic", "text": line}
+            
+            for event in parser.feed(text) if text else ():
+                if event["type"] in ("text", "result"):
+                    deadlines.output_started()
+                    stats.output_started()
+                if event["type"] == "text":
+                    chunk = coalescer.add(event["text"])
+                    if chunk:
+                        yield {"type": "text", "text": chunk}
+                    continue
                 
-            # Se já começamos a receber a resposta, enviamos cada linha
-            if response_started:
-                buffer += line
-                # Enviamos o buffer a cada 10-50 caracteres para um streaming suave
-                if len(buffer) >= 20:
-                    yield buffer, False, detected_conversation_id or conversation_id
-                    buffer = ""
-        
-        # Enviar qualquer texto restante no buffer
-        if buffer:
-            yield buffer, False, detected_conversation_id or conversation_id
+                # Entregar o texto pendente antes dos demais eventos
+                chunk = coalescer.flush()
+                if chunk:
+                    yield {"type": "text", "text": chunk}
+                yield event
             
-        # Sinalizar o fim do streaming
-        yield "", True, detected_conversation_id or conversation_id
+            if coalescer.is_due():
+                yield {"type": "text", "text": coalescer.flush()}
+        
+        # Processar um eventual objeto final sem quebra de linha
+        for event in parser.feed("\n"):
+            if event["type"] in ("text", "result"):
+                stats.output_started()
+            if event["type"] == "text":
+                coalescer.add(event["text"])
+            else:
+                yield event
+        
+        chunk = coalescer.flush()
+        if chunk:
+            yield {"type": "text", "text": chunk}
+        
+        for line in stderr.take_lines():
+            logger.debug(f"Claude CLI (stderr): {line}")
+            yield {"type": "diagnostic", "text": line}
+        
+        # Uso de recursos do processo, amostrado antes de ele sair
+        resources = stats.finish_resources()
+        if resources:
+            yield {"type": "resources", "resources": resources}
+        
+        # A saída já terminou: dar ao processo um instante para sair sozinho
+        try:
+            process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            pass
         
         # Verificar se houve erro
-        error = process.stderr.read()
-        if error:
-            logger.error(f"Erro durante o streaming do Claude CLI: {error}")
-            yield f"Erro: {error}", True, detected_conversation_id or conversation_id
+        error = stderr.text()
+        stats.session_id = parser.conversation_id
+        _record_usage(parser.result)
+        result_error = _stream_error(parser, error, process.returncode)
+        stats.status = "error" if result_error else "ok"
+        if result_error:
+            logger.error(f"Erro durante o streaming do Claude CLI: {result_error}")
+            yield {"type": "error", "error": result_error}
+        elif error:
+            logger.debug(f"Saída de erro do Claude CLI: {error}")
             
-    except subprocess.TimeoutExpired:
-        process.kill()
-        logger.error(f"Timeout ao aguardar resposta do Claude (limite: {CLAUDE_TIMEOUT}s)")
-        yield "Erro: A resposta demorou muito tempo.", True, None
+    except CallTimeout as e:
+        stats.status = "timeout"
+        stats.timeout_kind = e.kind
+        logger.error(f"Timeout ao aguardar resposta do Claude: {str(e)}")
+        yield {"type": "error", "error": "A resposta demorou muito tempo.", "timeout": e.kind}
     except Exception as e:
+        stats.status = "error"
         logger.exception("Erro inesperado durante o streaming com o Claude CLI")
-        yield f"Erro: {str(e)}", True, None
\ No newline at end of file
+        yield {"type": "error", "error": str(e)}
+    finally:
+        exit_code = None
+        if process is not None:
+            stats.finish_resources()
+            # Encerrar o grupo inteiro: também recolhe filhos que o CLI deixou para trás
+            kill_process_group(process)
+            exit_code = process.returncode
+        stats.record(exit_code)
+
+def stream_claude_response(message, conversation_id=None, context=None, use_cache=None,
+                           user_id=None, lane="interactive", use_single_flight=None):
+    """
+    Envia uma mensagem para o Claude Code CLI e retorna a resposta em streaming.
+    Permite integração com Streamlit para exibição gradual da resposta.
+    
+    Args:
+        message (str): A mensagem para enviar ao Claude
+        conversation_id (str, opcional): ID da sessão do Claude CLI a retomar
+        context (str, opcional): Contexto da memória do usuário, incluído no prompt
+        use_cache (bool, opcional): Usar o cache de respostas; None segue
+            CLAUDE_CACHE_ENABLED e False ignora o cache. Só vale para
+            prompts sem conversation_id, e uma resposta do cache não pertence
+            a nenhuma sessão (conversation_id None): não use o cache se a
+            conversa vai continuar
+        user_id (str, opcional): Usuário que fez o pedido (ex.: session_id do
+            Streamlit), para o rodízio justo na fila de admissão
+        lane (str): Fila de prioridade ("interactive" ou "batch")
+        use_single_flight (bool, opcional): Compartilhar o processo com pedidos
+            idênticos simultâneos (ver send_to_claude)
+        
+    Yields:
+        tuple: (fragmento_de_resposta, flag_de_finalização, conversation_id)
+    """
+    current_id = conversation_id
+    
+    cache_key = _cache_key(message, context, conversation_id) if _cache_enabled(use_cache) else None
+    if cache_key:
+        cached = get_response_cache().get(cache_key)
+        if cached is not None:
+            logger.debug("Resposta em streaming servida pelo cache")
+            yield cached, False, current_id
+            yield "", True, current_id
+            return
+    
+    prompt = build_prompt(message, context)
+    leader = True
+    if _single_flight_enabled(use_single_flight, conversation_id):
+        # Pedidos idênticos simultâneos que iniciam conversa recebem os fragmentos
+        # do mesmo processo; a sessão criada fica só com quem iniciou a chamada
+        events, leader = _single_flight.stream(
+            (message, context), lambda: stream_claude_events(prompt, None, user_id, lane))
+    else:
+        events = stream_claude_events(prompt, conversation_id, user_id, lane)
+    
+    parts = []
+    record = None
+    for event in events:
+        if event["type"] == "session" and not leader:
+            continue
+        if event["type"] == "session":
+            # Repassar o ID da sessão assim que o CLI o informa
+            current_id = current_id or event["session_id"]
+            yield "", False, current_id
+        
+        elif event["type"] == "text":
+            parts.append(event["text"])
+            yield event["text"], False, current_id
+        
+        elif event["type"] == "result":
+            record = event["record"]
+        
+        elif event["type"] == "error":
+            yield f"Erro: {event['error']}", True, current_id
+            return
+    
+    # Cachear apenas respostas completas: registro final sem erro e com texto
+    if cache_key and record is not None and not _result_error(record):
+        response = record.get("result")
+        if not isinstance(response, str):
+            response = "".join(parts)
+        if response.strip():
+            get_response_cache().set(cache_key, response.strip())
+    
+    # Sinalizar o fim do streaming
+    yield "", True, current_id
@@ -19,6 +19,9 @@ import uuid
 import logging
 import glob
 import re
+import time
+import threading
+from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Any, Optional, Tuple
@@ -37,10 +40,346 @@ TODOS_DIR = os.path.join(CLAUDE_DIR, "todos")
 STATSIG_DIR = os.path.join(CLAUDE_DIR, "statsig")
 CLAUDECHAT_DIR = os.path.join(CLAUDE_DIR, "claudechat")
 CHAT_HISTORY_PATH = os.path.join(CLAUDECHAT_DIR, "data", "chat_history.json")
+SESSION_INDEX_PATH = os.path.join(CLAUDECHAT_DIR, "data", "session_index.json")
 
 # Certificar de que o diretório de dados existe
 os.makedirs(os.path.join(CLAUDECHAT_DIR, "data"), exist_ok=True)
 
+class SessionIndex:
+    """
+    Índice persistente dos metadados das sessões (título, datas, número de
+    mensagens, tamanho e mtime de cada arquivo JSONL).
+    
+    Uma entrada só é recalculada quando o tamanho ou o mtime do arquivo
+    mudam: listar as sessões não precisa ler os arquivos inalterados.
+    """
+    
+    VERSION = 1
+    
+    def __init__(self, path: str = SESSION_INDEX_PATH):
+        """
+        Inicializa o índice, carregando o arquivo existente.
+        
+        Args:
+            path (str): Caminho do arquivo do índice
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = self._load()
+        self._dirty = False
+    
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """Carrega as entradas do arquivo (vazio se ausente ou inválido)."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION:
+                return data.get("sessions", {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Índice de sessões inválido, será reconstruído: {str(e)}")
+        return {}
+    
+    def get(self, jsonl_path: str, scan) -> Optional[Dict[str, Any]]:
+        """
+        Retorna a entrada de um arquivo de sessão, relendo-o se mudou.
+        
+        Args:
+            jsonl_path (str): Caminho do arquivo JSONL
+            scan (callable): Lê o arquivo e retorna a entrada; recebe o caminho
+            
+        Returns:
+            Dict: Entrada do índice ou None se o arquivo não existe
+        """
+        try:
+            stat = os.stat(jsonl_path)
+        except OSError:
+            return None
+        
+        with self._lock:
+            entry = self._entries.get(jsonl_path)
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+            return entry
+        
+        entry = scan(jsonl_path)
+        entry["size"] = stat.st_size
+        entry["mtime"] = stat.st_mtime_ns
+        with self._lock:
+            self._entries[jsonl_path] = entry
+            self._dirty = True
+        return entry
+    
+    def prune(self, paths: List[str]) -> None:
+        """
+        Remove as entradas de arquivos que não existem mais.
+        
+        Args:
+            paths (List[str]): Caminhos dos arquivos de sessão existentes
+        """
+        keep = set(paths)
+        with self._lock:
+            for path in [path for path in self._entries if path not in keep]:
+                del self._entries[path]
+                self._dirty = True
+    
+    def clear(self) -> None:
+        """Descarta todas as entradas (força a releitura de todos os arquivos)."""
+        with self._lock:
+            self._entries = {}
+            self._dirty = True
+    
+    def save(self) -> None:
+        """Grava o índice, de forma atômica, se houve alterações."""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"version": self.VERSION, "sessions": dict(self._entries)}
+            self._dirty = False
+        
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(data, ensure_ascii=False))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Erro ao gravar o índice de sessões: {str(e)}")
+            with self._lock:
+                self._dirty = True
+
+
+_session_index = None
+_session_index_lock = threading.Lock()
+
+def get_session_index() -> SessionIndex:
+    """
+    Retorna o índice de sessões compartilhado pelo processo.
+    
+    Returns:
+        SessionIndex: Instância carregada de SESSION_INDEX_PATH
+    """
+    global _session_index
+    with _session_index_lock:
+        if _session_index is None:
+            _session_index = SessionIndex()
+        return _session_index
+
+class _ParsedMessages:
+    """Mensagens já lidas de um arquivo de sessão e o ponto onde a leitura parou."""
+    
+    def __init__(self, inode: int):
+        self.inode = inode
+        self.offset = 0
+        self.messages: List[Dict[str, Any]] = []
+        self.lock = threading.Lock()
+
+
+# Sessões com mensagens em cache (as usadas há mais tempo saem primeiro)
+_MESSAGE_CACHE_SIZE = 64
+_message_cache: "OrderedDict[str, _ParsedMessages]" = OrderedDict()
+_message_cache_lock = threading.Lock()
+
+class StatsigIndex:
+    """
+    Índice dos arquivos de cache do Statsig por ID de sessão.
+    
+    Cada arquivo ``statsig.cached.evaluations.*`` é lido uma única vez (e de
+    novo só quando seu tamanho ou mtime mudam), extraindo os IDs no formato
+    UUID que ele contém. A busca do arquivo de uma sessão passa a ser uma
+    consulta ao dicionário em vez de ler todos os arquivos.
+    """
+    
+    # Intervalo mínimo (s) entre verificações do diretório
+    CHECK_INTERVAL = 1.0
+    UUID_PATTERN = re.compile(rb"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}")
+    
+    def __init__(self, directory: str = STATSIG_DIR):
+        """
+        Inicializa o índice.
+        
+        Args:
+            directory (str): Diretório dos arquivos do Statsig
+        """
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._files: Dict[str, Tuple[int, int, set]] = {}
+        self._sessions: Dict[str, str] = {}
+        self._checked_at = None
+    
+    def _refresh(self) -> None:
+        """Relê os arquivos novos ou alterados e reconstrói o mapa de sessões."""
+        paths = glob.glob(os.path.join(self.directory, "statsig.cached.evaluations.*"))
+        files = {}
+        changed = False
+        
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            known = self._files.get(path)
+            if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+                files[path] = known
+                continue
+            
+            try:
+                with open(path, 'rb') as f:
+                    ids = {match.decode().lower() for match in self.UUID_PATTERN.findall(f.read())}
+            except OSError:
+                continue
+            files[path] = (stat.st_size, stat.st_mtime_ns, ids)
+            changed = True
+        
+        if changed or files.keys() != self._files.keys():
+            sessions = {}
+            # Em caso de ID repetido, vale o primeiro arquivo em ordem alfabética
+            for path in sorted(files, reverse=True):
+                for session_id in files[path][2]:
+                    sessions[session_id] = path
+            self._files = files
+            self._sessions = sessions
+    
+    def lookup(self, session_id: str) -> Optional[str]:
+        """
+        Retorna o arquivo do Statsig que contém o ID da sessão.
+        
+        Args:
+            session_id (str): ID da sessão
+            
+        Returns:
+            str: Caminho do arquivo ou None se nenhum contém a sessão (IDs
+            fora do formato UUID nunca são encontrados)
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._checked_at is None or now - self._checked_at >= self.CHECK_INTERVAL:
+                self._refresh()
+                self._checked_at = now
+            return self._sessions.get(session_id.lower())
+
+
+_statsig_index = None
+_statsig_index_lock = threading.Lock()
+
+def get_statsig_index() -> StatsigIndex:
+    """
+    Retorna o índice do Statsig compartilhado pelo processo.
+    
+    Returns:
+        StatsigIndex: Instância para STATSIG_DIR
+    """
+    global _statsig_index
+    with _statsig_index_lock:
+        if _statsig_index is None:
+            _statsig_index = StatsigIndex()
+        return _statsig_index
+
+class StatsigEvaluations:
+    """
+    Avaliações decodificadas de um arquivo de cache do Statsig, com os
+    feature gates e as configurações dinâmicas indexados pela chave (hash)
+    e pelo nome.
+    """
+    
+    def __init__(self, feature_gates: Dict[str, Any], dynamic_configs: Dict[str, Any]):
+        self.feature_gates = feature_gates
+        self.dynamic_configs = dynamic_configs
+        self._gate_names = self._index_names(feature_gates)
+        self._config_names = self._index_names(dynamic_configs)
+    
+    @staticmethod
+    def _index_names(entries: Dict[str, Any]) -> Dict[str, Any]:
+        """Mapeia o campo "name" de cada entrada (vale a primeira de cada nome)."""
+        names = {}
+        for entry in entries.values():
+            if isinstance(entry, dict) and entry.get("name") is not None:
+                names.setdefault(entry["name"], entry)
+        return names
+    
+    def gate(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        Busca um feature gate pela chave ou pelo nome.
+        
+        Args:
+            name (str): Nome ou hash do feature gate
+            
+        Returns:
+            Dict: Avaliação do feature gate ou None se não existir
+        """
+        entry = self.feature_gates.get(name)
+        return entry if entry is not None else self._gate_names.get(name)
+    
+    def config(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        Busca uma configuração dinâmica pela chave ou pelo nome.
+        
+        Args:
+            name (str): Nome ou hash da configuração
+            
+        Returns:
+            Dict: Avaliação da configuração ou None se não existir
+        """
+        entry = self.dynamic_configs.get(name)
+        return entry if entry is not None else self._config_names.get(name)
+
+
+# Avaliações decodificadas por arquivo: (tamanho, mtime, avaliações)
+_statsig_evaluations: Dict[str, Tuple[int, int, Optional[StatsigEvaluations]]] = {}
+_statsig_evaluations_lock = threading.Lock()
+
+def load_statsig_evaluations(path: str) -> Optional[StatsigEvaluations]:
+    """
+    Decodifica um arquivo de cache do Statsig, reaproveitando o resultado
+    enquanto o tamanho e o mtime do arquivo não mudarem.
+    
+    Args:
+        path (str): Caminho do arquivo statsig.cached.evaluations.*
+        
+    Returns:
+        StatsigEvaluations: Avaliações do arquivo ou None se inválido
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    
+    with _statsig_evaluations_lock:
+        cached = _statsig_evaluations.get(path)
+    if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+        return cached[2]
+    
+    evaluations = None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.loads(f.read())
+        # O campo "data" é um JSON codificado como texto
+        if "data" in data:
+            config_data = json.loads(data["data"])
+            evaluations = StatsigEvaluations(config_data.get("feature_gates", {}),
+                                             config_data.get("dynamic_configs", {}))
+    except Exception as e:
+        logger.error(f"Erro ao ler configurações Statsig: {str(e)}")
+    
+    with _statsig_evaluations_lock:
+        _statsig_evaluations[path] = (stat.st_size, stat.st_mtime_ns, evaluations)
+    return evaluations
+
+# Estado da última sincronização com o chat_history.json: o histórico em
+# memória, a assinatura (tamanho, mtime) do arquivo gravado e a assinatura
+# do arquivo JSONL de cada sessão já sincronizada
+_sync_lock = threading.Lock()
+_sync_state: Dict[str, Any] = {"history": None, "signature": None, "sessions": {}}
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """Retorna (tamanho, mtime) de um arquivo, ou None se não existir."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
 class ClaudeIntegration:
     """
     Classe responsável por integrar diferentes componentes do Claude CLI,
@@ -57,36 +396,122 @@ class ClaudeIntegration:
         os.makedirs(TODOS_DIR, exist_ok=True)
         os.makedirs(os.path.join(CLAUDECHAT_DIR, "data"), exist_ok=True)
     
-    def get_all_sessions(self) -> List[Dict[str, Any]]:
+    def _session_files(self) -> List[str]:
         """
-        Retorna uma lista de todas as sessões disponíveis do Claude CLI
-        com seus metadados.
+        Retorna os caminhos de todos os arquivos JSONL de sessão.
         
         Returns:
-            List[Dict]: Lista de sessões com metadados
+            List[str]: Caminhos dos arquivos
         """
-        sessions = []
-        
         # Padrões para encontrar arquivos JSONL
         patterns = [
             os.path.join(PROJECTS_DIR, "-root--claude", "*.jsonl"),
             os.path.join(PROJECTS_DIR, "-root--claude-claudechat", "*.jsonl")
         ]
         
+        files = []
         for pattern in patterns:
-            files = glob.glob(pattern)
-            for file_path in files:
-                session_id = os.path.basename(file_path).replace(".jsonl", "")
-                
-                # Extrair informações da sessão
-                session_info = self.get_session_metadata(session_id)
-                if session_info:
-                    session_info["file_path"] = file_path
-                    sessions.append(session_info)
+            files.extend(glob.glob(pattern))
+        return files
+    
+    def get_all_sessions(self) -> List[Dict[str, Any]]:
+        """
+        Retorna uma lista de todas as sessões disponíveis do Claude CLI
+        com seus metadados.
+        
+        Returns:
+            List[Dict]: Lista de sessões com metadados
+        """
+        sessions = []
+        files = self._session_files()
+        
+        for file_path in files:
+            session_id = os.path.basename(file_path).replace(".jsonl", "")
+            
+            # Extrair informações da sessão (do índice, se o arquivo não mudou)
+            session_info = self._session_metadata(session_id)
+            if session_info:
+                session_info["file_path"] = file_path
+                sessions.append(session_info)
+        
+        index = get_session_index()
+        index.prune(files)
+        index.save()
         
         # Ordenar por data mais recente
         return sorted(sessions, key=lambda x: x.get("last_updated", ""), reverse=True)
     
+    def rebuild_session_index(self, full: bool = False) -> int:
+        """
+        Atualiza o índice de metadados das sessões.
+        
+        Args:
+            full (bool): Reler todos os arquivos, e não apenas os alterados
+            
+        Returns:
+            int: Número de sessões no índice
+        """
+        index = get_session_index()
+        if full:
+            index.clear()
+        
+        files = self._session_files()
+        count = sum(1 for file_path in files
+                    if index.get(file_path, self._scan_session_file) is not None)
+        index.prune(files)
+        index.save()
+        return count
+    
+    def _scan_session_file(self, jsonl_path: str) -> Dict[str, Any]:
+        """
+        Lê um arquivo de sessão uma vez, linha a linha, extraindo os dados
+        guardados no índice.
+        
+        Args:
+            jsonl_path (str): Caminho do arquivo JSONL
+            
+        Returns:
+            Dict: Entrada do índice ("valid" é False se o arquivo está vazio
+            ou a primeira linha é inválida)
+        """
+        entry = {"valid": False}
+        first_line = None
+        last_line = None
+        message_count = 0
+        
+        with open(jsonl_path, 'rb') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                if first_line is None:
+                    first_line = line
+                last_line = line
+                if b'"type":"user"' in line or b'"role":"user"' in line:
+                    message_count += 1
+        
+        if first_line is None:
+            return entry
+        
+        try:
+            first_message = json.loads(first_line)
+        except ValueError as e:
+            logger.error(f"Erro ao ler metadados de {jsonl_path}: {str(e)}")
+            return entry
+        try:
+            last_message = json.loads(last_line)
+        except ValueError:
+            # Última linha ainda sendo escrita: fica a data da primeira até a próxima releitura
+            last_message = first_message
+        
+        entry.update({
+            "valid": True,
+            "title": self._extract_title(first_message),
+            "created_at": first_message.get("timestamp", ""),
+            "last_updated": last_message.get("timestamp", ""),
+            "message_count": message_count
+        })
+        return entry
+    
     def get_session_metadata(self, session_id: str) -> Optional[Dict[str, Any]]:
         """
         Obtém metadados de uma sessão específica.
@@ -97,72 +522,71 @@ class ClaudeIntegration:
         Returns:
             Dict: Metadados da sessão ou None se não existir
         """
+        metadata = self._session_metadata(session_id)
+        get_session_index().save()
+        return metadata
+    
+    def _session_path(self, session_id: str) -> Optional[str]:
+        """
+        Localiza o arquivo JSONL de uma sessão.
+        
+        Args:
+            session_id (str): ID da sessão
+            
+        Returns:
+            str: Caminho do arquivo ou None se não existir
+        """
         # Verificar padrões de arquivos JSONL
         patterns = [
             os.path.join(PROJECTS_DIR, "-root--claude", f"{session_id}.jsonl"),
             os.path.join(PROJECTS_DIR, "-root--claude-claudechat", f"{session_id}.jsonl")
         ]
         
-        jsonl_path = None
         for pattern in patterns:
             if os.path.exists(pattern):
-                jsonl_path = pattern
-                break
+                return pattern
+        return None
+    
+    def _session_metadata(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtém metadados de uma sessão sem gravar o índice (ver get_session_metadata).
         
+        Args:
+            session_id (str): ID da sessão
+            
+        Returns:
+            Dict: Metadados da sessão ou None se não existir
+        """
+        jsonl_path = self._session_path(session_id)
         if not jsonl_path:
             return None
         
-        # Ler primeira e última mensagem para obter metadados
+        # Título, datas e contagem vêm do índice (relidos só se o arquivo mudou)
         try:
-            with open(jsonl_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-                
-                if not lines:
-                    return None
-                
-                first_message = json.loads(lines[0])
-                last_message = json.loads(lines[-1])
-                
-                # Extrair título da primeira mensagem do usuário
-                title = self._extract_title(first_message)
-                
-                # Calcular estatísticas da conversa
-                message_count = len([line for line in lines if '"type":"user"' in line or 
-                                      '"role":"user"' in line])
-                
-                # Verificar timestamp
-                created_at = first_message.get("timestamp", "")
-                updated_at = last_message.get("timestamp", "")
-                
-                # Verificar se existe arquivo de tarefas
-                todos_path = os.path.join(TODOS_DIR, f"{session_id}.json")
-                has_todos = os.path.exists(todos_path)
-                
-                # Verificar se existe configuração Statsig
-                statsig_files = glob.glob(os.path.join(STATSIG_DIR, f"statsig.cached.evaluations.*"))
-                statsig_file = None
-                
-                for sf in statsig_files:
-                    try:
-                        with open(sf, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                            if session_id in content:
-                                statsig_file = sf
-                                break
-                    except:
-                        continue
-                        
-                return {
-                    "session_id": session_id,
-                    "title": title,
-                    "created_at": created_at,
-                    "last_updated": updated_at,
-                    "message_count": message_count,
-                    "jsonl_path": jsonl_path,
-                    "todos_path": todos_path if has_todos else None,
-                    "statsig_path": statsig_file,
-                    "has_todos": has_todos
-                }
+            entry = get_session_index().get(jsonl_path, self._scan_session_file)
+            if not entry or not entry["valid"]:
+                return None
+            
+            # Verificar se existe arquivo de tarefas
+            todos_path = os.path.join(TODOS_DIR, f"{session_id}.json")
+            has_todos = os.path.exists(todos_path)
+            
+            # Verificar se existe configuração Statsig
+            statsig_file = get_statsig_index().lookup(session_id)
+                    
+            return {
+                "session_id": session_id,
+                "title": entry["title"],
+                "created_at": entry["created_at"],
+                "last_updated": entry["last_updated"],
+                "message_count": entry["message_count"],
+                "jsonl_path": jsonl_path,
+                "todos_path": todos_path if has_todos else None,
+                "statsig_path": statsig_file,
+                "has_todos": has_todos,
+                "file_size": entry["size"],
+                "file_mtime": entry["mtime"]
+            }
                 
         except Exception as e:
             logger.error(f"Erro ao ler metadados da sessão {session_id}: {str(e)}")
@@ -209,35 +633,79 @@ class ClaudeIntegration:
         """
         Obtém todas as mensagens de uma conversa em formato padronizado.
         
+        As mensagens já lidas ficam em cache com a posição onde a leitura
+        parou: chamadas seguintes leem apenas as linhas acrescentadas ao
+        arquivo. Uma última linha incompleta (ainda sendo escrita) não avança
+        a posição e é lida de novo na próxima chamada.
+        
         Args:
             session_id (str): ID da sessão
             
         Returns:
             List[Dict]: Lista de mensagens formatadas
         """
-        session_info = self.get_session_metadata(session_id)
-        if not session_info or not session_info.get("jsonl_path"):
+        jsonl_path = self._session_path(session_id)
+        if not jsonl_path:
             return []
         
         try:
-            jsonl_path = session_info["jsonl_path"]
-            messages = []
+            stat = os.stat(jsonl_path)
+            with _message_cache_lock:
+                parsed = _message_cache.get(jsonl_path)
+                # Arquivo substituído ou truncado: ler do início
+                if parsed is None or parsed.inode != stat.st_ino or stat.st_size < parsed.offset:
+                    parsed = _ParsedMessages(stat.st_ino)
+                    _message_cache[jsonl_path] = parsed
+                _message_cache.move_to_end(jsonl_path)
+                while len(_message_cache) > _MESSAGE_CACHE_SIZE:
+                    _message_cache.popitem(last=False)
             
-            with open(jsonl_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    try:
-                        entry = json.loads(line)
-                        msg = self._format_message(entry)
-                        if msg:
-                            messages.append(msg)
-                    except json.JSONDecodeError:
-                        continue
+            with parsed.lock:
+                tail = b""
+                if stat.st_size > parsed.offset:
+                    with open(jsonl_path, 'rb') as f:
+                        f.seek(parsed.offset)
+                        data = f.read()
+                    
+                    # Consumir apenas até a última quebra de linha
+                    end = data.rfind(b"\n") + 1
+                    parsed.messages.extend(self._parse_lines(data[:end]))
+                    parsed.offset += end
+                    tail = data[end:]
+                
+                messages = list(parsed.messages)
             
+            # Uma última linha sem quebra que já é JSON válido entra no resultado,
+            # mas só é consumida quando a quebra de linha chegar
+            messages.extend(self._parse_lines(tail))
             return messages
         except Exception as e:
             logger.error(f"Erro ao ler mensagens da sessão {session_id}: {str(e)}")
             return []
     
+    def _parse_lines(self, data: bytes) -> List[Dict[str, Any]]:
+        """
+        Converte linhas JSONL em mensagens formatadas, ignorando as inválidas.
+        
+        Args:
+            data (bytes): Conteúdo com uma entrada JSON por linha
+            
+        Returns:
+            List[Dict]: Mensagens formatadas
+        """
+        messages = []
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            msg = self._format_message(entry)
+            if msg:
+                messages.append(msg)
+        return messages
+    
     def _format_message(self, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
         Formata uma entrada JSONL em uma mensagem padronizada.
@@ -310,95 +778,186 @@ class ClaudeIntegration:
         Returns:
             Dict: Configurações Statsig
         """
-        statsig_files = glob.glob(os.path.join(STATSIG_DIR, "statsig.cached.evaluations.*"))
-        
-        for statsig_file in statsig_files:
-            try:
-                with open(statsig_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    if session_id in content:
-                        data = json.loads(content)
-                        # Extrair as configurações relevantes
-                        if "data" in data:
-                            try:
-                                config_data = json.loads(data["data"])
-                                return {
-                                    "feature_gates": config_data.get("feature_gates", {}),
-                                    "dynamic_configs": config_data.get("dynamic_configs", {})
-                                }
-                            except:
-                                pass
-            except Exception as e:
-                logger.error(f"Erro ao ler configurações Statsig: {str(e)}")
+        evaluations = self.get_statsig_evaluations(session_id)
+        if evaluations:
+            return {
+                "feature_gates": evaluations.feature_gates,
+                "dynamic_configs": evaluations.dynamic_configs
+            }
         
         return {"feature_gates": {}, "dynamic_configs": {}}
     
+    def get_statsig_evaluations(self, session_id: str) -> Optional[StatsigEvaluations]:
+        """
+        Obtém as avaliações Statsig decodificadas de uma sessão (compartilhadas
+        pelo processo; não devem ser modificadas).
+        
+        Args:
+            session_id (str): ID da sessão
+            
+        Returns:
+            StatsigEvaluations: Avaliações ou None se a sessão não tem arquivo Statsig
+        """
+        statsig_file = get_statsig_index().lookup(session_id)
+        if not statsig_file:
+            return None
+        return load_statsig_evaluations(statsig_file)
+    
+    def _load_chat_history(self, default: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Carrega o chat_history.json, reaproveitando a cópia em memória se o
+        arquivo não mudou desde a última gravação feita por este processo.
+        
+        Deve ser chamado com _sync_lock adquirido.
+        
+        Args:
+            default (Dict): Histórico usado se o arquivo não existir
+            
+        Returns:
+            Dict: Histórico (compartilhado: não alterar; montar as mudanças
+            em uma cópia e gravá-la com _write_chat_history)
+        """
+        signature = _file_signature(CHAT_HISTORY_PATH)
+        if signature is not None and signature == _sync_state["signature"]:
+            return _sync_state["history"]
+        
+        if signature is not None:
+            with open(CHAT_HISTORY_PATH, 'r', encoding='utf-8') as f:
+                chat_history = json.load(f)
+        else:
+            chat_history = default
+        
+        _sync_state["history"] = chat_history
+        _sync_state["signature"] = signature
+        return chat_history
+    
+    def _write_chat_history(self, chat_history: Dict[str, Any]) -> None:
+        """
+        Grava o chat_history.json de forma atômica (arquivo temporário
+        sincronizado no disco e os.replace): nem uma falha no meio da gravação
+        nem uma queda de energia deixam o histórico corrompido ou vazio. Só
+        após a gravação o histórico passa a ser a cópia em memória.
+        
+        Deve ser chamado com _sync_lock adquirido.
+        
+        Args:
+            chat_history (Dict): Histórico completo
+        """
+        tmp_path = f"{CHAT_HISTORY_PATH}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                # json.dumps sem indentação usa o codificador em C (json.dump, não)
+                f.write(json.dumps(chat_history, ensure_ascii=False))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, CHAT_HISTORY_PATH)
+        except Exception:
+            # A cópia em memória pode divergir do arquivo: reler na próxima vez
+            _sync_state["signature"] = None
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        
+        _sync_state["history"] = chat_history
+        _sync_state["signature"] = _file_signature(CHAT_HISTORY_PATH)
+    
+    def _build_conversation(self, session: Dict[str, Any], conversation_id: int) -> Dict[str, Any]:
+        """
+        Monta a conversa no formato do histórico do claudechat.
+        
+        Args:
+            session (Dict): Metadados da sessão (ver get_session_metadata)
+            conversation_id (int): ID da conversa no histórico
+            
+        Returns:
+            Dict: Conversa com as mensagens que têm conteúdo
+        """
+        conversation = {
+            "id": conversation_id,
+            "title": session["title"],
+            "timestamp": self._convert_timestamp(session["created_at"]),
+            "last_updated": self._convert_timestamp(session["last_updated"]),
+            "session_id": session["session_id"],
+            "messages": []
+        }
+        
+        # Obter mensagens formatadas
+        for msg in self.get_conversation_messages(session["session_id"]):
+            # Incluir apenas se tiver conteúdo
+            if msg["content"]:
+                conversation["messages"].append({
+                    "role": msg["role"],
+                    "content": msg["content"]
+                })
+        
+        return conversation
+    
     def sync_with_claudechat(self) -> None:
         """
         Sincroniza as sessões do Claude CLI com o ClaudeChat.
-        Atualiza o arquivo chat_history.json com as sessões existentes.
+        
+        Apenas as sessões cujo arquivo JSONL mudou desde a última
+        sincronização são remontadas, e o chat_history.json só é regravado
+        (de forma atômica) se alguma conversa mudou.
         """
         try:
-            # Verificar se o arquivo de histórico existe
-            if os.path.exists(CHAT_HISTORY_PATH):
-                with open(CHAT_HISTORY_PATH, 'r', encoding='utf-8') as f:
-                    chat_history = json.load(f)
-            else:
-                chat_history = {"conversations": [], "user_info": {"user_name": "", "preferences": {}, "context": {}}}
-            
-            # Obter todas as sessões do Claude CLI
-            sessions = self.get_all_sessions()
-            
-            # Para cada sessão, verificar se já existe no histórico
-            existing_session_ids = {
-                conv.get("session_id", ""): idx 
-                for idx, conv in enumerate(chat_history["conversations"])
-            }
-            
-            # Processar cada sessão
-            for session in sessions:
-                session_id = session["session_id"]
+            with _sync_lock:
+                loaded = self._load_chat_history(
+                    {"conversations": [], "user_info": {"user_name": "", "preferences": {}, "context": {}}})
+                # Alterar uma cópia: a versão em memória só muda se a gravação der certo
+                chat_history = dict(loaded, conversations=list(loaded["conversations"]))
                 
-                # Formato para o histórico do claudechat
-                conversation = {
-                    "id": len(chat_history["conversations"]) + 1 if session_id not in existing_session_ids else chat_history["conversations"][existing_session_ids[session_id]]["id"],
-                    "title": session["title"],
-                    "timestamp": self._convert_timestamp(session["created_at"]),
-                    "last_updated": self._convert_timestamp(session["last_updated"]),
-                    "session_id": session_id,
-                    "messages": []
+                # Obter todas as sessões do Claude CLI (metadados do índice)
+                sessions = self.get_all_sessions()
+                
+                # Para cada sessão, verificar se já existe no histórico
+                existing_session_ids = {
+                    conv.get("session_id", ""): idx 
+                    for idx, conv in enumerate(chat_history["conversations"])
                 }
                 
-                # Obter mensagens formatadas
-                messages = self.get_conversation_messages(session_id)
-                if messages:
-                    # Formatar para o formato esperado pelo claudechat
-                    for msg in messages:
-                        # Incluir apenas se tiver conteúdo
-                        if msg["content"]:
-                            conversation["messages"].append({
-                                "role": msg["role"],
-                                "content": msg["content"]
-                            })
+                synced = _sync_state["sessions"]
+                changed = {}
+                updated = 0
                 
-                # Atualizar ou adicionar a conversa
-                if session_id in existing_session_ids:
-                    chat_history["conversations"][existing_session_ids[session_id]] = conversation
-                else:
-                    chat_history["conversations"].append(conversation)
-            
-            # Ordenar por última atualização
-            chat_history["conversations"] = sorted(
-                chat_history["conversations"], 
-                key=lambda x: x.get("last_updated", ""), 
-                reverse=True
-            )
-            
-            # Salvar o arquivo atualizado
-            with open(CHAT_HISTORY_PATH, 'w', encoding='utf-8') as f:
-                json.dump(chat_history, f, indent=2, ensure_ascii=False)
+                for session in sessions:
+                    session_id = session["session_id"]
+                    signature = (session["jsonl_path"], session["file_size"], session["file_mtime"])
+                    
+                    # Arquivo inalterado desde a última sincronização
+                    if session_id in existing_session_ids and synced.get(session_id) == signature:
+                        continue
+                    changed[session_id] = signature
+                    
+                    if session_id in existing_session_ids:
+                        idx = existing_session_ids[session_id]
+                        conversation = self._build_conversation(session, chat_history["conversations"][idx]["id"])
+                        if chat_history["conversations"][idx] != conversation:
+                            chat_history["conversations"][idx] = conversation
+                            updated += 1
+                    else:
+                        conversation = self._build_conversation(session, len(chat_history["conversations"]) + 1)
+                        existing_session_ids[session_id] = len(chat_history["conversations"])
+                        chat_history["conversations"].append(conversation)
+                        updated += 1
                 
-            logger.info(f"Sincronização com Claude Chat concluída: {len(chat_history['conversations'])} conversas")
+                if updated:
+                    # Ordenar por última atualização
+                    chat_history["conversations"] = sorted(
+                        chat_history["conversations"], 
+                        key=lambda x: x.get("last_updated", ""), 
+                        reverse=True
+                    )
+                    
+                    # Salvar o arquivo atualizado
+                    self._write_chat_history(chat_history)
+                synced.update(changed)
+                
+            if updated:
+                logger.info(f"Sincronização com Claude Chat concluída: {updated} de "
+                            f"{len(chat_history['conversations'])} conversas atualizadas")
+            else:
+                logger.debug("Sincronização com Claude Chat: nenhuma conversa alterada")
             
         except Exception as e:
             logger.error(f"Erro ao sincronizar com Claude Chat: {str(e)}")
@@ -479,18 +1038,14 @@ class ClaudeIntegration:
             user_info (Dict): Informações do usuário
         """
         try:
-            if os.path.exists(CHAT_HISTORY_PATH):
-                with open(CHAT_HISTORY_PATH, 'r', encoding='utf-8') as f:
-                    chat_history = json.load(f)
-            else:
-                chat_history = {"conversations": [], "user_info": {}}
-            
-            # Atualizar informações do usuário
-            chat_history["user_info"] = user_info
-            
-            # Salvar o arquivo atualizado
-            with open(CHAT_HISTORY_PATH, 'w', encoding='utf-8') as f:
-                json.dump(chat_history, f, indent=2, ensure_ascii=False)
+            with _sync_lock:
+                loaded = self._load_chat_history({"conversations": [], "user_info": {}})
+                
+                # Atualizar informações do usuário (em uma cópia, até a gravação)
+                chat_history = dict(loaded, user_info=user_info)
+                
+                # Salvar o arquivo atualizado
+                self._write_chat_history(chat_history)
                 
             logger.info(f"Informações do usuário atualizadas")
             
@@ -0,0 +1,184 @@
+"""
+Prazo de cada chamada ao Claude CLI aprendido com o histórico
+
+Um prazo fixo (CLAUDE_TIMEOUT) é longo demais para prompts curtos que
+travam e curto demais para prompts longos que ainda estão trabalhando. O
+modelo guarda a duração das chamadas recentes por faixa de tamanho do
+prompt e por sessão e define o prazo de cada chamada como o p95 observado
+multiplicado por uma folga, dentro dos limites CLAUDE_TIMEOUT_MIN e
+CLAUDE_TIMEOUT_MAX.
+
+O prazo aprendido vale só até a primeira saída do modelo: uma resposta que
+já está chegando nunca é interrompida por ele (a partir daí vale o limite
+de inatividade). Cada chamada que estoura o prazo eleva a estimativa da sua
+faixa e da sua sessão diretamente, sem depender de mover o p95.
+"""
+
+import math
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, Any, Optional
+from config.settings import (
+    CLAUDE_TIMEOUT, CLAUDE_ADAPTIVE_TIMEOUT, CLAUDE_TIMEOUT_MIN, CLAUDE_TIMEOUT_MAX,
+    CLAUDE_TIMEOUT_HEADROOM
+)
+
+# Medidas guardadas por faixa/sessão e número máximo de sessões acompanhadas
+_WINDOW = 200
+_SESSION_WINDOW = 20
+_MAX_SESSIONS = 1000
+# Medidas necessárias antes de confiar em uma faixa ou sessão
+_MIN_SAMPLES = 5
+_MIN_SESSION_SAMPLES = 3
+
+
+def _p95(values) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+def _estimate(samples, min_samples: int) -> Optional[float]:
+    """
+    Duração esperada a partir das medidas (duração, estourou_o_prazo).
+
+    O p95 só é usado com medidas suficientes; um prazo estourado ainda na
+    janela vale sempre como estimativa mínima.
+    """
+    estimates = []
+    if len(samples) >= min_samples:
+        estimates.append(_p95(duration for duration, _ in samples))
+    timeouts = [duration for duration, timed_out in samples if timed_out]
+    if timeouts:
+        estimates.append(max(timeouts))
+    return max(estimates) if estimates else None
+
+
+class LatencyModel:
+    """
+    Durações recentes por faixa de tamanho do prompt (potências de 2, em
+    bytes) e por sessão, marcando as chamadas que estouraram o prazo.
+    """
+
+    def __init__(self, default: float, minimum: float, maximum: float, headroom: float):
+        """
+        Inicializa o modelo.
+
+        Args:
+            default (float): Prazo usado enquanto não há medidas suficientes
+            minimum (float): Prazo mínimo
+            maximum (float): Prazo máximo
+            headroom (float): Multiplicador aplicado ao p95 observado
+        """
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.default = min(max(default, self.minimum), self.maximum)
+        self.headroom = headroom
+        self._lock = threading.Lock()
+        self._buckets: Dict[int, deque] = {}
+        self._sessions: "OrderedDict[str, deque]" = OrderedDict()
+
+    @staticmethod
+    def _bucket(prompt_bytes: int) -> int:
+        """Faixa de tamanho do prompt (log2 do número de bytes)."""
+        return int(math.log2(max(prompt_bytes, 1)))
+
+    def deadline(self, prompt_bytes: int, session_id: Optional[str] = None) -> float:
+        """
+        Calcula o prazo de uma chamada até a primeira saída do modelo.
+
+        Usa a maior estimativa entre a faixa de tamanho do prompt e a sessão
+        (quando há medidas suficientes de cada uma ou um prazo estourado).
+
+        Args:
+            prompt_bytes (int): Tamanho do prompt em bytes
+            session_id (str, opcional): Sessão retomada pela chamada
+
+        Returns:
+            float: Prazo em segundos
+        """
+        estimates = []
+        with self._lock:
+            bucket = self._buckets.get(self._bucket(prompt_bytes))
+            if bucket:
+                estimates.append(_estimate(bucket, _MIN_SAMPLES))
+            session = self._sessions.get(session_id) if session_id else None
+            if session:
+                estimates.append(_estimate(session, _MIN_SESSION_SAMPLES))
+
+        estimates = [estimate for estimate in estimates if estimate is not None]
+        if not estimates:
+            return self.default
+        return min(max(max(estimates) * self.headroom, self.minimum), self.maximum)
+
+    def observe(self, prompt_bytes: int, duration: float, session_id: Optional[str] = None,
+                timed_out: bool = False) -> None:
+        """
+        Registra a duração de uma chamada.
+
+        Uma chamada interrompida pelo prazo é registrada com o próprio prazo
+        como duração e marcada: enquanto estiver na janela, o próximo prazo da
+        faixa e da sessão é pelo menos esse prazo vezes a folga, então a
+        estimativa cresce a cada estouro até o máximo.
+
+        Args:
+            prompt_bytes (int): Tamanho do prompt em bytes
+            duration (float): Duração em segundos (o prazo, se estourou)
+            session_id (str, opcional): Sessão da chamada
+            timed_out (bool): Se a chamada foi interrompida pelo prazo
+        """
+        sample = (duration, timed_out)
+        with self._lock:
+            self._buckets.setdefault(self._bucket(prompt_bytes), deque(maxlen=_WINDOW)).append(sample)
+            if session_id:
+                session = self._sessions.pop(session_id, None) or deque(maxlen=_SESSION_WINDOW)
+                session.append(sample)
+                self._sessions[session_id] = session
+                while len(self._sessions) > _MAX_SESSIONS:
+                    self._sessions.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Retorna o prazo atual de cada faixa de tamanho.
+
+        Returns:
+            Dict: Limites configurados e, por faixa ("2^n bytes"), medidas e prazo
+        """
+        with self._lock:
+            buckets = {key: list(samples) for key, samples in sorted(self._buckets.items())}
+            sessions = len(self._sessions)
+
+        return {
+            "minimum": self.minimum,
+            "maximum": self.maximum,
+            "default": self.default,
+            "sessions": sessions,
+            "buckets": {
+                f"2^{key} bytes": {
+                    "samples": len(samples),
+                    "timeouts": sum(1 for _, timed_out in samples if timed_out),
+                    "p95": _p95(duration for duration, _ in samples),
+                    "deadline": self.deadline(2 ** key)
+                } for key, samples in buckets.items()
+            }
+        }
+
+
+_latency_model = None
+_latency_model_lock = threading.Lock()
+
+def get_latency_model() -> Optional[LatencyModel]:
+    """
+    Retorna o modelo de latência compartilhado pelo processo.
+
+    Returns:
+        LatencyModel: Instância criada com as configurações da aplicação, ou
+        None se os prazos adaptativos estiverem desativados
+    """
+    global _latency_model
+    if not CLAUDE_ADAPTIVE_TIMEOUT:
+        return None
+    with _latency_model_lock:
+        if _latency_model is None:
+            _latency_model = LatencyModel(CLAUDE_TIMEOUT, CLAUDE_TIMEOUT_MIN, CLAUDE_TIMEOUT_MAX,
+                                          CLAUDE_TIMEOUT_HEADROOM)
+        return _latency_model
@@ -0,0 +1,323 @@
+"""
+Métricas das chamadas ao Claude CLI no formato texto do Prometheus
+
+Cada chamada registra em histogramas o tempo para obter o processo, o tempo
+até o primeiro byte, a duração total e os bytes enviados e recebidos, além
+de um contador por status de saída. As métricas podem ser expostas por um
+endpoint HTTP local (CLAUDE_METRICS_PORT) e/ou gravadas periodicamente em um
+arquivo (CLAUDE_METRICS_FILE), por exemplo para o textfile collector do
+node_exporter.
+"""
+
+import os
+import math
+import time
+import atexit
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from config.settings import CLAUDE_METRICS_PORT, CLAUDE_METRICS_FILE, CLAUDE_METRICS_FILE_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 90, 120, 300)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+MEMORY_BUCKETS = (32 * 2**20, 64 * 2**20, 128 * 2**20, 256 * 2**20, 512 * 2**20, 2**30, 2 * 2**30, 4 * 2**30)
+
+# Amostra de um coletor: (nome, tipo, ajuda, rótulos, valor)
+Sample = Tuple[str, str, str, Dict[str, str], float]
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    """Formata os rótulos de uma série ({chave="valor",...})."""
+    if not labels:
+        return ""
+    items = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        items.append(f'{key}="{value}"')
+    return "{" + ",".join(items) + "}"
+
+
+def _format_value(value: float) -> str:
+    """Formata um valor numérico como o Prometheus espera."""
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Contador crescente, com séries separadas por rótulos."""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[Tuple[Tuple[str, str], ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, labels: Optional[Dict[str, str]] = None) -> None:
+        key = tuple(sorted((labels or {}).items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(dict(key))} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Histograma com limites fixos, com séries separadas por rótulos."""
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float]):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        # Por série: (contagens por limite, soma, total de observações)
+        self._series: Dict[Tuple[Tuple[str, str], ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        key = tuple(sorted((labels or {}).items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                labels = dict(key)
+                for bound, bucket_count in zip(self.buckets, counts):
+                    bucket_labels = _format_labels({**labels, "le": _format_value(bound)})
+                    lines.append(f"{self.name}_bucket{bucket_labels} {bucket_count}")
+                lines.append(f'{self.name}_bucket{_format_labels({**labels, "le": "+Inf"})} {count}')
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Conjunto de métricas do processo.
+
+    Além dos contadores e histogramas, aceita coletores: funções chamadas a
+    cada exportação que retornam amostras de estado atual (ocupação do
+    escalonador, pool, cache etc.).
+    """
+
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        metric = Counter(name, help_text)
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float]) -> Histogram:
+        metric = Histogram(name, help_text, buckets)
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def render(self) -> str:
+        """
+        Gera as métricas no formato texto do Prometheus.
+
+        Returns:
+            str: Conteúdo da exposição
+        """
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+
+        # Agrupar as amostras dos coletores por nome (HELP/TYPE uma única vez)
+        families: Dict[str, Tuple[str, str, List[str]]] = {}
+        for collector in collectors:
+            try:
+                samples = list(collector())
+            except Exception as e:
+                logger.error(f"Erro ao coletar métricas: {str(e)}")
+                continue
+            for name, metric_type, help_text, labels, value in samples:
+                family = families.setdefault(name, (metric_type, help_text, []))
+                family[2].append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for name, (metric_type, help_text, samples) in families.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.extend(samples)
+
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+CLI_SPAWN_SECONDS = registry.histogram(
+    "claude_cli_spawn_seconds", "Tempo para obter o processo do Claude CLI", LATENCY_BUCKETS)
+CLI_FIRST_BYTE_SECONDS = registry.histogram(
+    "claude_cli_first_byte_seconds", "Tempo entre o envio do prompt e o primeiro byte da saída", LATENCY_BUCKETS)
+CLI_DURATION_SECONDS = registry.histogram(
+    "claude_cli_duration_seconds", "Duração total da chamada ao Claude CLI", LATENCY_BUCKETS)
+CLI_REQUEST_BYTES = registry.histogram(
+    "claude_cli_request_bytes", "Tamanho do prompt enviado ao Claude CLI", SIZE_BUCKETS)
+CLI_RESPONSE_BYTES = registry.histogram(
+    "claude_cli_response_bytes", "Bytes lidos da saída padrão do Claude CLI", SIZE_BUCKETS)
+CLI_CPU_SECONDS = registry.histogram(
+    "claude_cli_cpu_seconds", "Tempo de CPU (usuário + sistema) do processo do Claude CLI", LATENCY_BUCKETS)
+CLI_PEAK_RSS_BYTES = registry.histogram(
+    "claude_cli_peak_rss_bytes", "Pico de memória residente do processo do Claude CLI", MEMORY_BUCKETS)
+CLI_IO_BYTES = registry.histogram(
+    "claude_cli_io_bytes", "Bytes lidos/gravados em disco pelo processo do Claude CLI", SIZE_BUCKETS)
+CLI_CALLS = registry.counter(
+    "claude_cli_calls_total", "Chamadas ao Claude CLI por resultado e status de saída")
+
+
+def record_cli_call(status: str, exit_code: Optional[int], duration: float,
+                    spawn: Optional[float] = None, first_byte: Optional[float] = None,
+                    bytes_in: int = 0, bytes_out: int = 0,
+                    resources: Optional[Dict[str, Optional[float]]] = None,
+                    started: bool = True) -> None:
+    """
+    Registra as medidas de uma chamada ao Claude CLI.
+
+    Args:
+        status (str): Resultado da chamada ("ok", "error", "timeout" ou "cancelled")
+        exit_code (int): Código de saída do processo (None se foi encerrado pela aplicação)
+        duration (float): Duração total em segundos
+        spawn (float, opcional): Tempo para obter o processo
+        first_byte (float, opcional): Tempo até o primeiro byte da saída
+        bytes_in (int): Bytes enviados pela entrada padrão
+        bytes_out (int): Bytes lidos da saída padrão
+        resources (dict, opcional): Uso de recursos do processo (ver
+            utils.proc_stats.ProcessUsage.as_dict)
+        started (bool): Se o processo chegou a ser iniciado; uma falha ao
+            iniciá-lo (ex.: executável inexistente) é registrada com
+            exit_code="spawn_failed", separada dos processos encerrados ("killed")
+    """
+    labels = {"status": status}
+    if not started:
+        exit_label = "spawn_failed"
+    else:
+        exit_label = "killed" if exit_code is None else str(exit_code)
+    CLI_CALLS.inc(labels={"status": status, "exit_code": exit_label})
+    CLI_DURATION_SECONDS.observe(duration, labels)
+    if spawn is not None:
+        CLI_SPAWN_SECONDS.observe(spawn)
+    if first_byte is not None:
+        CLI_FIRST_BYTE_SECONDS.observe(first_byte)
+    CLI_REQUEST_BYTES.observe(bytes_in)
+    CLI_RESPONSE_BYTES.observe(bytes_out, labels)
+    if resources and resources.get("samples"):
+        CLI_CPU_SECONDS.observe(resources["cpu_seconds"], labels)
+        if resources.get("peak_rss_bytes") is not None:
+            CLI_PEAK_RSS_BYTES.observe(resources["peak_rss_bytes"], labels)
+        for direction in ("read", "write"):
+            if resources.get(f"{direction}_bytes") is not None:
+                CLI_IO_BYTES.observe(resources[f"{direction}_bytes"], {"direction": direction})
+
+    start_metrics_export()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Responde GET /metrics com a exposição atual."""
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"Métricas: {format % args}")
+
+
+def write_metrics_file(path: str) -> None:
+    """
+    Grava a exposição atual em um arquivo, de forma atômica.
+
+    Args:
+        path (str): Caminho do arquivo
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(tmp_path, path)
+
+
+def _write_metrics_file_safe(path: str) -> None:
+    """Grava o arquivo de métricas sem propagar erros."""
+    try:
+        write_metrics_file(path)
+    except Exception as e:
+        logger.error(f"Erro ao gravar o arquivo de métricas: {str(e)}")
+
+
+def _file_writer_loop(path: str, interval: float) -> None:
+    """Regrava o arquivo de métricas periodicamente."""
+    while True:
+        _write_metrics_file_safe(path)
+        time.sleep(interval)
+
+
+_export_started = False
+_export_lock = threading.Lock()
+
+def start_metrics_export() -> None:
+    """
+    Inicia a exposição das métricas conforme a configuração, uma única vez
+    por processo: endpoint HTTP em 127.0.0.1:CLAUDE_METRICS_PORT e/ou
+    gravação periódica em CLAUDE_METRICS_FILE.
+    """
+    global _export_started
+    if _export_started:
+        return
+    with _export_lock:
+        if _export_started:
+            return
+        _export_started = True
+
+        if CLAUDE_METRICS_PORT:
+            try:
+                server = ThreadingHTTPServer(("127.0.0.1", CLAUDE_METRICS_PORT), _MetricsHandler)
+                server.daemon_threads = True
+                threading.Thread(target=server.serve_forever, name="claude-metrics-http",
+                                 daemon=True).start()
+                logger.info(f"Métricas disponíveis em http://127.0.0.1:{CLAUDE_METRICS_PORT}/metrics")
+            except OSError as e:
+                logger.warning(f"Não foi possível abrir a porta de métricas {CLAUDE_METRICS_PORT}: {str(e)}")
+
+        if CLAUDE_METRICS_FILE:
+            threading.Thread(target=_file_writer_loop,
+                             args=(CLAUDE_METRICS_FILE, CLAUDE_METRICS_FILE_INTERVAL),
+                             name="claude-metrics-file", daemon=True).start()
+            # Gravar as últimas medidas também ao encerrar (ex.: run.py lote)
+            atexit.register(_write_metrics_file_safe, CLAUDE_METRICS_FILE)
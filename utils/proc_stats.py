@@ -0,0 +1,184 @@
+"""
+Uso de recursos dos processos do Claude CLI lido de /proc
+
+Enquanto uma chamada roda, uma thread amostra periodicamente o tempo de
+CPU, o pico de memória residente (VmHWM) e o I/O do processo filho. Os
+valores finais vão para as métricas e para o evento "resources" de
+stream_claude_events, para dimensionar o pool e os limites de concorrência
+com dados reais.
+
+Disponível apenas em sistemas com /proc (Linux); nos demais o amostrador
+fica desativado.
+"""
+
+import os
+import threading
+from typing import Dict, Any, Optional
+from config.settings import CLAUDE_PROC_SAMPLE_INTERVAL
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def read_process_usage(pid: int) -> Optional[Dict[str, int]]:
+    """
+    Lê o uso de recursos de um processo em /proc.
+
+    Args:
+        pid (int): PID do processo
+
+    Returns:
+        Dict: cpu_ticks (inclui filhos já encerrados), peak_rss_bytes,
+        read_bytes e write_bytes (quando disponíveis), ou None se o processo
+        não existe mais
+    """
+    usage = {}
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat = f.read().decode("ascii", errors="replace")
+        # O nome do comando pode conter espaços: os campos seguem o último ")"
+        fields = stat[stat.rindex(")") + 2:].split()
+        # utime, stime, cutime, cstime (campos 14 a 17 do arquivo)
+        usage["cpu_ticks"] = sum(int(value) for value in fields[11:15])
+    except (OSError, ValueError, IndexError):
+        return None
+
+    try:
+        with open(f"/proc/{pid}/status", "rb") as f:
+            for line in f:
+                if line.startswith(b"VmHWM:"):
+                    usage["peak_rss_bytes"] = int(line.split()[1]) * 1024
+                    break
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        with open(f"/proc/{pid}/io", "rb") as f:
+            for line in f:
+                key, _, value = line.partition(b":")
+                if key in (b"read_bytes", b"write_bytes"):
+                    usage[key.decode()] = int(value)
+    except (OSError, ValueError):
+        # /proc/<pid>/io pode exigir permissões extras
+        pass
+
+    return usage
+
+
+class ProcessUsage:
+    """Maiores valores observados nas amostras de um processo."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.samples = 0
+        self.cpu_ticks = 0
+        self.peak_rss_bytes = None
+        self.read_bytes = None
+        self.write_bytes = None
+
+    def update(self, usage: Dict[str, int]) -> None:
+        """Incorpora uma amostra (os contadores só crescem)."""
+        self.samples += 1
+        self.cpu_ticks = max(self.cpu_ticks, usage.get("cpu_ticks", 0))
+        for key in ("peak_rss_bytes", "read_bytes", "write_bytes"):
+            if key in usage:
+                setattr(self, key, max(getattr(self, key) or 0, usage[key]))
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "cpu_seconds": self.cpu_ticks / _CLOCK_TICKS,
+            "peak_rss_bytes": self.peak_rss_bytes,
+            "read_bytes": self.read_bytes,
+            "write_bytes": self.write_bytes,
+            "samples": self.samples
+        }
+
+
+class ProcessSampler:
+    """
+    Uma única thread amostra todos os processos acompanhados a cada
+    ``interval`` segundos.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._tracked: Dict[int, ProcessUsage] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def track(self, pid: int) -> ProcessUsage:
+        """
+        Começa a acompanhar um processo.
+
+        Args:
+            pid (int): PID do processo
+
+        Returns:
+            ProcessUsage: Valores atualizados a cada amostra
+        """
+        usage = ProcessUsage(pid)
+        with self._lock:
+            self._tracked[pid] = usage
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="claude-proc-sampler",
+                                                daemon=True)
+                self._thread.start()
+            self._wake.notify()
+        return usage
+
+    def finish(self, pid: int) -> Optional[Dict[str, Any]]:
+        """
+        Faz uma última amostra (antes de o processo ser recolhido) e para de
+        acompanhar o processo.
+
+        Args:
+            pid (int): PID do processo
+
+        Returns:
+            Dict: Uso de recursos (ver ProcessUsage.as_dict), ou None se o
+            processo não era acompanhado
+        """
+        with self._lock:
+            usage = self._tracked.pop(pid, None)
+        if usage is None:
+            return None
+        sample = read_process_usage(pid)
+        if sample:
+            usage.update(sample)
+        return usage.as_dict()
+
+    def _loop(self) -> None:
+        """Amostra os processos acompanhados enquanto houver algum."""
+        while True:
+            with self._lock:
+                while not self._tracked:
+                    self._wake.wait()
+                tracked = list(self._tracked.values())
+
+            for usage in tracked:
+                sample = read_process_usage(usage.pid)
+                if sample:
+                    usage.update(sample)
+
+            with self._lock:
+                self._wake.wait(self.interval)
+
+
+_process_sampler = None
+_process_sampler_lock = threading.Lock()
+
+def get_process_sampler() -> Optional[ProcessSampler]:
+    """
+    Retorna o amostrador compartilhado pelo processo.
+
+    Returns:
+        ProcessSampler: Instância criada com as configurações da aplicação,
+        ou None se desativado ou sem /proc
+    """
+    global _process_sampler
+    if CLAUDE_PROC_SAMPLE_INTERVAL <= 0 or not os.path.exists(f"/proc/{os.getpid()}/stat"):
+        return None
+    with _process_sampler_lock:
+        if _process_sampler is None:
+            _process_sampler = ProcessSampler(CLAUDE_PROC_SAMPLE_INTERVAL)
+        return _process_sampler
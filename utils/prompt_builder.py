@@ -0,0 +1,150 @@
+"""
+Montagem do contexto do prompt dentro de um orçamento de tokens
+
+O contexto da memória do usuário (nome, informações e preferências) é
+incluído em todos os prompts. Para que ele não cresça sem limite, cada item
+é avaliado pela relevância para a mensagem atual e os itens são incluídos em
+ordem de relevância até o orçamento (CLAUDE_PROMPT_TOKEN_BUDGET) se esgotar;
+um item longo pode ser truncado para caber no espaço restante.
+"""
+
+import re
+import logging
+from typing import Dict, Any, List, Optional
+from config.settings import CLAUDE_PROMPT_TOKEN_BUDGET
+
+logger = logging.getLogger(__name__)
+
+# Texto fixo que build_prompt() acrescenta em volta do contexto
+_CONTEXT_WRAPPER = "[CONTEXTO: ]\n\n"
+# Espaço mínimo (em tokens) para valer a pena incluir um item truncado
+_MIN_TRUNCATED_TOKENS = 8
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estima o número de tokens de um texto.
+
+    Usa a aproximação de ~4 bytes UTF-8 por token, suficiente para controlar
+    o orçamento sem depender de um tokenizador.
+
+    Args:
+        text (str): Texto a estimar
+
+    Returns:
+        int: Número estimado de tokens
+    """
+    if not text:
+        return 0
+    return (len(text.encode("utf-8")) + 3) // 4
+
+
+def _words(text: str) -> set:
+    """Palavras significativas (4+ letras) de um texto, em minúsculas."""
+    return {word for word in _WORD_RE.findall(text.lower()) if len(word) > 3}
+
+
+def _memory_entries(memory: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Converte a memória do usuário em itens de contexto, na ordem de exibição.
+
+    Cada item recebe também a sua recência dentro do próprio tipo (de 0 a 1,
+    pela ordem de inserção: a memória não guarda datas), para que o item mais
+    novo de informações e o de preferências concorram em pé de igualdade.
+    """
+    entries = []
+    if memory.get("user_name"):
+        entries.append({"kind": "name", "key": None, "value": str(memory["user_name"]), "recency": 1.0})
+    for kind, items in (("context", memory.get("context")), ("preference", memory.get("preferences"))):
+        items = list((items or {}).items())
+        for index, (key, value) in enumerate(items):
+            entries.append({"kind": kind, "key": str(key), "value": str(value),
+                            "recency": (index + 1) / len(items)})
+
+    for position, entry in enumerate(entries):
+        entry["position"] = position
+    return entries
+
+
+def _render(entries: List[Dict[str, Any]]) -> str:
+    """Monta o contexto no formato usado pelo app."""
+    context = ""
+    preferences = []
+    for entry in sorted(entries, key=lambda e: e["position"]):
+        if entry["kind"] == "name":
+            context += f"O nome do usuário é {entry['value']}. "
+        elif entry["kind"] == "context":
+            context += f"{entry['key']}: {entry['value']}. "
+        else:
+            preferences.append(f"{entry['key']}: {entry['value']}")
+
+    if preferences:
+        context += "Preferências do usuário: " + ", ".join(preferences) + ". "
+
+    return context.strip()
+
+
+def _rank(entries: List[Dict[str, Any]], message: str) -> List[Dict[str, Any]]:
+    """
+    Ordena os itens por relevância: o nome primeiro, depois os itens que
+    compartilham palavras com a mensagem e, por fim, os mais recentes dentro
+    de cada tipo (informações e preferências se alternam em caso de empate).
+    """
+    message_words = _words(message)
+
+    def score(entry):
+        if entry["kind"] == "name":
+            return (float("inf"), 0)
+        overlap = len(message_words & _words(f"{entry['key']} {entry['value']}"))
+        # Desempate pelo item mais curto: mais itens cabem no orçamento
+        return (overlap + entry["recency"], -len(entry["value"]))
+
+    return sorted(entries, key=score, reverse=True)
+
+
+def build_context(memory: Dict[str, Any], message: str = "",
+                  budget: Optional[int] = None) -> str:
+    """
+    Monta o contexto da memória do usuário para a mensagem atual.
+
+    Args:
+        memory (Dict): Memória do usuário (user_name, context, preferences)
+        message (str): Mensagem que será enviada, usada para ordenar os itens
+            por relevância e descontada do orçamento
+        budget (int, opcional): Orçamento de tokens do prompt completo;
+            None usa CLAUDE_PROMPT_TOKEN_BUDGET e 0 desativa o limite
+
+    Returns:
+        str: Contexto dentro do orçamento (vazio se não couber nada)
+    """
+    budget = CLAUDE_PROMPT_TOKEN_BUDGET if budget is None else budget
+    entries = _memory_entries(memory or {})
+    if not entries:
+        return ""
+    if not budget:
+        return _render(entries)
+
+    available = budget - estimate_tokens(message) - estimate_tokens(_CONTEXT_WRAPPER)
+    kept = []
+
+    # O custo é medido no contexto montado, com cabeçalhos e separadores
+    for entry in _rank(entries, message):
+        if estimate_tokens(_render(kept + [entry])) <= available:
+            kept.append(entry)
+            continue
+
+        # Truncar o valor para aproveitar o espaço restante
+        remaining = available - estimate_tokens(_render(kept + [{**entry, "value": ""}]))
+        if remaining >= _MIN_TRUNCATED_TOKENS:
+            # "…" ocupa 3 bytes: o valor truncado cabe em remaining tokens
+            value = entry["value"].encode("utf-8")[:remaining * 4 - 4].decode("utf-8", errors="ignore")
+            kept.append({**entry, "value": value.rstrip() + "…"})
+
+    context = _render(kept)
+    if len(kept) < len(entries) or any(entry["value"].endswith("…") for entry in kept):
+        logger.debug(f"Contexto reduzido ao orçamento: {len(kept)} de {len(entries)} itens "
+                     f"(~{estimate_tokens(context)} de {available} tokens)")
+
+    return context
@@ -0,0 +1,182 @@
+"""
+Cache de respostas do Claude em disco
+
+Prompts repetidos (por exemplo, "resuma este arquivo" sobre o mesmo
+conteúdo) não precisam de uma nova chamada ao Claude CLI. O cache guarda
+as respostas em um banco SQLite, com limite de tamanho (remove as entradas
+usadas há mais tempo) e validade por entrada.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Optional
+from config.settings import CLAUDE_CACHE_PATH, CLAUDE_CACHE_MAX_ENTRIES, CLAUDE_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Cache persistente de respostas com política LRU e expiração (TTL).
+    """
+
+    def __init__(self, path: str, max_entries: int = 1000, ttl: int = 86400):
+        """
+        Inicializa o cache.
+
+        Args:
+            path (str): Caminho do banco SQLite
+            max_entries (int): Número máximo de respostas guardadas (0 = sem limite)
+            ttl (int): Validade de cada resposta em segundos (0 = sem expiração)
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)"
+        )
+
+    @staticmethod
+    def make_key(message: str, context: Optional[str], mode: str) -> str:
+        """
+        Calcula a chave de uma chamada.
+
+        Args:
+            message (str): Mensagem do usuário
+            context (str): Contexto da memória do usuário (build_context())
+            mode (str): Modo da conversa (o claude_cli só cacheia "new")
+
+        Returns:
+            str: Chave do cache
+        """
+        # Normalizar espaços para que variações de formatação compartilhem a entrada
+        normalized = " ".join(message.split())
+        payload = json.dumps([normalized, " ".join((context or "").split()), mode],
+                             ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Busca uma resposta no cache.
+
+        Args:
+            key (str): Chave calculada por make_key()
+
+        Returns:
+            str: Resposta guardada ou None se não existir ou tiver expirado
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            response, created_at = row
+            if self.ttl and now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return response
+
+    def set(self, key: str, response: str) -> None:
+        """
+        Guarda uma resposta no cache, removendo entradas antigas se necessário.
+
+        Args:
+            key (str): Chave calculada por make_key()
+            response (str): Resposta do Claude
+        """
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, created_at, last_access)"
+                    " VALUES (?, ?, ?, ?)",
+                    (key, response, now, now)
+                )
+                self._evict(now)
+            except sqlite3.Error as e:
+                logger.error(f"Erro ao gravar no cache de respostas: {str(e)}")
+
+    def _evict(self, now: float) -> None:
+        """Remove entradas expiradas e as menos usadas além do limite."""
+        removed = 0
+        if self.ttl:
+            removed += self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)
+            ).rowcount
+        if self.max_entries:
+            removed += self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            ).rowcount
+        self.evictions += max(removed, 0)
+
+    def clear(self) -> None:
+        """Remove todas as respostas do cache."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Retorna os contadores do cache.
+
+        Returns:
+            Dict: Acertos, falhas, remoções e número de entradas
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+def get_response_cache() -> ResponseCache:
+    """
+    Retorna o cache de respostas compartilhado pelo processo.
+
+    Returns:
+        ResponseCache: Instância criada com as configurações da aplicação
+    """
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache(CLAUDE_CACHE_PATH, CLAUDE_CACHE_MAX_ENTRIES, CLAUDE_CACHE_TTL)
+        return _response_cache
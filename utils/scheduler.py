@@ -0,0 +1,306 @@
+"""
+Controle de admissão das chamadas ao Claude CLI
+
+Limita quantos processos do Claude CLI rodam ao mesmo tempo. Os pedidos
+excedentes aguardam em filas por prioridade ("interactive" antes de
+"batch") e, dentro de cada fila, são atendidos em rodízio entre usuários,
+de modo que um usuário com muitos pedidos não bloqueia os demais.
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Any, Optional
+from config.settings import CLAUDE_MAX_CONCURRENCY, CLAUDE_BATCH_MAX_CONCURRENCY, CLAUDE_QUEUE_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+LANES = ("interactive", "batch")
+
+
+class QueueTimeout(Exception):
+    """O pedido esperou mais que o limite na fila de admissão."""
+
+
+class _Ticket:
+    """Pedido aguardando na fila."""
+
+    def __init__(self, user_id: str, lane: str):
+        self.user_id = user_id
+        self.lane = lane
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        # Chamado (com o lock do escalonador) quando o pedido é admitido
+        self.on_grant = None
+
+
+class AdmissionScheduler:
+    """
+    Limite global de concorrência com filas por prioridade e rodízio por usuário.
+    """
+
+    def __init__(self, max_concurrency: int, batch_max_concurrency: Optional[int] = None,
+                 queue_timeout: Optional[float] = None):
+        """
+        Inicializa o escalonador.
+
+        Args:
+            max_concurrency (int): Máximo de chamadas simultâneas
+            batch_max_concurrency (int, opcional): Máximo de chamadas "batch"
+                simultâneas, para sempre sobrar vaga a pedidos interativos
+            queue_timeout (float, opcional): Tempo máximo de espera na fila
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.batch_max_concurrency = min(self.max_concurrency,
+                                         batch_max_concurrency or self.max_concurrency)
+        self.queue_timeout = queue_timeout or None
+        self._cond = threading.Condition()
+        self._running = {lane: 0 for lane in LANES}
+        # Por fila: usuário -> pedidos aguardando (a ordem das chaves define o rodízio)
+        self._queues = {lane: OrderedDict() for lane in LANES}
+        self._depth = {lane: 0 for lane in LANES}
+        self._max_depth = {lane: 0 for lane in LANES}
+        self._admitted = {lane: 0 for lane in LANES}
+        self._timeouts = {lane: 0 for lane in LANES}
+        self._wait_total = {lane: 0.0 for lane in LANES}
+        self._recent_waits = {lane: deque(maxlen=1000) for lane in LANES}
+
+    @contextmanager
+    def slot(self, user_id: Optional[str] = None, lane: str = "interactive"):
+        """
+        Aguarda uma vaga para executar uma chamada.
+
+        Args:
+            user_id (str, opcional): Identificador do usuário (ex.: session_id do Streamlit)
+            lane (str): Fila de prioridade ("interactive" ou "batch")
+
+        Raises:
+            QueueTimeout: Se a espera ultrapassar o limite configurado
+        """
+        if lane not in LANES:
+            raise ValueError(f"Fila desconhecida: {lane}")
+
+        ticket = self._acquire(user_id or "anonymous", lane)
+        try:
+            yield
+        finally:
+            self._release(ticket)
+
+    @asynccontextmanager
+    async def async_slot(self, user_id: Optional[str] = None, lane: str = "interactive"):
+        """
+        Versão assíncrona de slot(): aguarda a vaga sem bloquear o event loop.
+
+        Os pedidos assíncronos entram nas mesmas filas e contam no mesmo
+        limite global que as chamadas síncronas.
+
+        Args:
+            user_id (str, opcional): Identificador do usuário
+            lane (str): Fila de prioridade ("interactive" ou "batch")
+
+        Raises:
+            QueueTimeout: Se a espera ultrapassar o limite configurado
+        """
+        if lane not in LANES:
+            raise ValueError(f"Fila desconhecida: {lane}")
+
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def notify():
+            try:
+                loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+            except RuntimeError:
+                # Event loop já encerrado: ninguém vai usar a vaga
+                pass
+
+        ticket = _Ticket(user_id or "anonymous", lane)
+        ticket.on_grant = notify
+        with self._cond:
+            self._enqueue(ticket)
+
+        try:
+            await asyncio.wait_for(asyncio.shield(granted), self.queue_timeout)
+        except BaseException as e:
+            with self._cond:
+                if ticket.granted:
+                    # Admitido enquanto desistia: devolver a vaga
+                    self._running[lane] -= 1
+                    self._dispatch()
+                else:
+                    self._remove(ticket)
+                    if isinstance(e, asyncio.TimeoutError):
+                        self._timeouts[lane] += 1
+            if isinstance(e, asyncio.TimeoutError):
+                raise QueueTimeout(f"Tempo de espera na fila esgotado ({self.queue_timeout}s)") from None
+            raise
+
+        with self._cond:
+            self._record_admission(ticket)
+        try:
+            yield
+        finally:
+            self._release(ticket)
+
+    def try_acquire(self, user_id: Optional[str] = None, lane: str = "interactive") -> Optional[_Ticket]:
+        """
+        Ocupa uma vaga só se houver uma livre agora e ninguém esperando na fila.
+
+        Usado para trabalho opcional (ex.: cópias de hedging), que não deve
+        esperar nem passar à frente dos pedidos enfileirados.
+
+        Args:
+            user_id (str, opcional): Identificador do usuário
+            lane (str): Fila de prioridade ("interactive" ou "batch")
+
+        Returns:
+            _Ticket: Vaga ocupada (devolver com release()), ou None se não há vaga livre
+        """
+        if lane not in LANES:
+            raise ValueError(f"Fila desconhecida: {lane}")
+        with self._cond:
+            if any(self._depth.values()) or sum(self._running.values()) >= self.max_concurrency:
+                return None
+            if lane == "batch" and self._running["batch"] >= self.batch_max_concurrency:
+                return None
+            ticket = _Ticket(user_id or "anonymous", lane)
+            ticket.granted = True
+            self._running[lane] += 1
+            self._record_admission(ticket)
+            return ticket
+
+    def release(self, ticket: _Ticket) -> None:
+        """Devolve uma vaga obtida com try_acquire()."""
+        self._release(ticket)
+
+    def _enqueue(self, ticket: _Ticket) -> None:
+        """Coloca o pedido na fila e admite quem couber (chamar com o lock adquirido)."""
+        lane = ticket.lane
+        self._queues[lane].setdefault(ticket.user_id, deque()).append(ticket)
+        self._depth[lane] += 1
+        self._max_depth[lane] = max(self._max_depth[lane], self._depth[lane])
+        self._dispatch()
+
+    def _record_admission(self, ticket: _Ticket) -> None:
+        """Registra o tempo de espera de um pedido admitido (chamar com o lock adquirido)."""
+        waited = time.monotonic() - ticket.enqueued_at
+        self._admitted[ticket.lane] += 1
+        self._wait_total[ticket.lane] += waited
+        self._recent_waits[ticket.lane].append(waited)
+        if waited > 1:
+            logger.debug(f"Pedido de {ticket.user_id} ({ticket.lane}) aguardou {waited:.2f}s na fila")
+
+    def _acquire(self, user_id: str, lane: str) -> _Ticket:
+        """Enfileira o pedido e aguarda até ser admitido."""
+        ticket = _Ticket(user_id, lane)
+        deadline = ticket.enqueued_at + self.queue_timeout if self.queue_timeout else None
+
+        with self._cond:
+            self._enqueue(ticket)
+
+            while not ticket.granted:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._remove(ticket)
+                    self._timeouts[lane] += 1
+                    raise QueueTimeout(f"Tempo de espera na fila esgotado ({self.queue_timeout}s)")
+                self._cond.wait(remaining)
+
+            self._record_admission(ticket)
+        return ticket
+
+    def _release(self, ticket: _Ticket) -> None:
+        """Libera a vaga ocupada e admite os próximos pedidos."""
+        with self._cond:
+            self._running[ticket.lane] -= 1
+            self._dispatch()
+
+    def _remove(self, ticket: _Ticket) -> None:
+        """Retira da fila um pedido que desistiu de esperar."""
+        queue = self._queues[ticket.lane].get(ticket.user_id)
+        if queue and ticket in queue:
+            queue.remove(ticket)
+            self._depth[ticket.lane] -= 1
+            if not queue:
+                del self._queues[ticket.lane][ticket.user_id]
+
+    def _dispatch(self) -> None:
+        """Admite pedidos enquanto houver vagas (chamar com o lock adquirido)."""
+        admitted = False
+        while sum(self._running.values()) < self.max_concurrency:
+            ticket = self._next_ticket()
+            if ticket is None:
+                break
+            ticket.granted = True
+            self._running[ticket.lane] += 1
+            admitted = True
+            if ticket.on_grant is not None:
+                ticket.on_grant()
+        if admitted:
+            self._cond.notify_all()
+
+    def _next_ticket(self) -> Optional[_Ticket]:
+        """Escolhe o próximo pedido: fila interativa primeiro, rodízio entre usuários."""
+        for lane in LANES:
+            if lane == "batch" and self._running["batch"] >= self.batch_max_concurrency:
+                continue
+            users = self._queues[lane]
+            if not users:
+                continue
+            user_id, queue = next(iter(users.items()))
+            ticket = queue.popleft()
+            # O usuário vai para o fim do rodízio (ou sai, se não tiver mais pedidos)
+            del users[user_id]
+            if queue:
+                users[user_id] = queue
+            self._depth[lane] -= 1
+            return ticket
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Retorna métricas de ocupação e de espera nas filas.
+
+        Returns:
+            Dict: Chamadas em execução e, por fila, profundidade atual e máxima,
+            pedidos admitidos, desistências e tempos de espera
+        """
+        with self._cond:
+            lanes = {}
+            for lane in LANES:
+                waits = sorted(self._recent_waits[lane])
+                lanes[lane] = {
+                    "running": self._running[lane],
+                    "queue_depth": self._depth[lane],
+                    "max_queue_depth": self._max_depth[lane],
+                    "admitted": self._admitted[lane],
+                    "timeouts": self._timeouts[lane],
+                    "wait_seconds_total": self._wait_total[lane],
+                    "wait_seconds_p95": waits[int(len(waits) * 0.95)] if waits else 0.0
+                }
+            return {
+                "max_concurrency": self.max_concurrency,
+                "running": sum(self._running.values()),
+                "lanes": lanes
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> AdmissionScheduler:
+    """
+    Retorna o escalonador compartilhado pelo processo.
+
+    Returns:
+        AdmissionScheduler: Instância criada com as configurações da aplicação
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = AdmissionScheduler(CLAUDE_MAX_CONCURRENCY, CLAUDE_BATCH_MAX_CONCURRENCY,
+                                            CLAUDE_QUEUE_TIMEOUT)
+        return _scheduler
@@ -227,12 +227,12 @@ class SessionManager:
         Returns:
             bool: True se o feature estiver ativado, False caso contrário
         """
-        feature_flags = self.get_feature_flags(session_id)
+        evaluations = self.integration.get_statsig_evaluations(session_id)
         
-        # Buscar por nomes ou por hashes numéricos
-        for key, flag in feature_flags.items():
-            if key == feature_name or flag.get("name") == feature_name:
-                return flag.get("value", default)
+        # Buscar por nomes ou por hashes numéricos (índices do cache compartilhado)
+        flag = evaluations.gate(feature_name) if evaluations else None
+        if flag is not None:
+            return flag.get("value", default)
         
         return default
     
@@ -248,11 +248,11 @@ class SessionManager:
         Returns:
             Any: Valor da configuração
         """
-        configs = self.get_dynamic_configs(session_id)
+        evaluations = self.integration.get_statsig_evaluations(session_id)
         
-        # Buscar por nomes ou por hashes numéricos
-        for key, config in configs.items():
-            if key == config_name or config.get("name") == config_name:
-                return config.get("value", default)
+        # Buscar por nomes ou por hashes numéricos (índices do cache compartilhado)
+        config = evaluations.config(config_name) if evaluations else None
+        if config is not None:
+            return config.get("value", default)
         
         return default
\ No newline at end of file
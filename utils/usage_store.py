@@ -0,0 +1,152 @@
+"""
+Registro de uso das chamadas ao Claude CLI
+
+O registro final da saída stream-json ("type": "result") informa a duração,
+o número de turnos, os tokens usados e o custo de cada chamada. Os registros
+são guardados em um banco SQLite, por sessão, para identificar as conversas
+mais lentas e mais caras (ver o comando "uso" do run.py).
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, Any, List, Optional
+from config.settings import CLAUDE_USAGE_PATH
+
+logger = logging.getLogger(__name__)
+
+# Colunas de ordenação aceitas por top_sessions()
+_ORDER_COLUMNS = {
+    "duration": "duration_ms",
+    "cost": "cost_usd",
+    "tokens": "input_tokens + output_tokens"
+}
+
+
+class UsageStore:
+    """
+    Registros de uso por chamada, consultáveis por sessão.
+    """
+
+    def __init__(self, path: str):
+        """
+        Inicializa o registro.
+
+        Args:
+            path (str): Caminho do banco SQLite
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS calls ("
+            " session_id TEXT NOT NULL,"
+            " recorded_at REAL NOT NULL,"
+            " is_error INTEGER NOT NULL,"
+            " duration_ms INTEGER,"
+            " duration_api_ms INTEGER,"
+            " num_turns INTEGER,"
+            " cost_usd REAL,"
+            " input_tokens INTEGER,"
+            " output_tokens INTEGER,"
+            " cache_read_tokens INTEGER,"
+            " cache_creation_tokens INTEGER)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_calls_session ON calls (session_id)")
+
+    def record(self, result: Dict[str, Any]) -> None:
+        """
+        Guarda o registro final de uma chamada.
+
+        Args:
+            result (dict): Registro "result" da saída stream-json do Claude CLI
+        """
+        session_id = result.get("session_id")
+        if not session_id:
+            return
+
+        usage = result.get("usage") or {}
+        row = (
+            session_id,
+            time.time(),
+            1 if result.get("is_error") or result.get("subtype", "success") != "success" else 0,
+            result.get("duration_ms"),
+            result.get("duration_api_ms"),
+            result.get("num_turns"),
+            result.get("total_cost_usd", result.get("cost_usd")),
+            usage.get("input_tokens"),
+            usage.get("output_tokens"),
+            usage.get("cache_read_input_tokens"),
+            usage.get("cache_creation_input_tokens")
+        )
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT INTO calls (session_id, recorded_at, is_error, duration_ms, duration_api_ms,"
+                    " num_turns, cost_usd, input_tokens, output_tokens, cache_read_tokens,"
+                    " cache_creation_tokens) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    row
+                )
+            except sqlite3.Error as e:
+                logger.error(f"Erro ao gravar o registro de uso: {str(e)}")
+
+    def top_sessions(self, order_by: str = "duration", limit: int = 10,
+                     since: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Retorna as sessões com maior total no critério escolhido.
+
+        Args:
+            order_by (str): "duration", "cost" ou "tokens"
+            limit (int): Número máximo de sessões
+            since (float, opcional): Considerar apenas chamadas a partir deste timestamp
+
+        Returns:
+            List[Dict]: Totais por sessão, do maior para o menor
+        """
+        order = _ORDER_COLUMNS[order_by]
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT session_id, COUNT(*), SUM(is_error), SUM(COALESCE(num_turns, 0)),"
+                " SUM(COALESCE(duration_ms, 0)) AS duration_ms, MAX(COALESCE(duration_ms, 0)),"
+                " SUM(COALESCE(cost_usd, 0)) AS cost_usd,"
+                " SUM(COALESCE(input_tokens, 0)) AS input_tokens,"
+                " SUM(COALESCE(output_tokens, 0)) AS output_tokens, MAX(recorded_at)"
+                " FROM calls WHERE recorded_at >= ?"
+                f" GROUP BY session_id ORDER BY {order} DESC LIMIT ?",
+                (since or 0, limit)
+            ).fetchall()
+
+        return [{
+            "session_id": row[0],
+            "calls": row[1],
+            "errors": row[2],
+            "turns": row[3],
+            "duration_ms": row[4],
+            "max_duration_ms": row[5],
+            "cost_usd": row[6],
+            "input_tokens": row[7],
+            "output_tokens": row[8],
+            "last_call_at": row[9]
+        } for row in rows]
+
+
+_usage_store = None
+_usage_store_lock = threading.Lock()
+
+def get_usage_store() -> UsageStore:
+    """
+    Retorna o registro de uso compartilhado pelo processo.
+
+    Returns:
+        UsageStore: Instância criada com as configurações da aplicação
+    """
+    global _usage_store
+    with _usage_store_lock:
+        if _usage_store is None:
+            _usage_store = UsageStore(CLAUDE_USAGE_PATH)
+        return _usage_store
@@ -0,0 +1,364 @@
+"""
+Pool de processos do Claude CLI pré-iniciados
+
+Cada chamada ao Claude CLI paga o custo de iniciar o processo (runtime,
+carregamento de configuração e autenticação) antes de começar a responder.
+O pool mantém processos já iniciados aguardando o prompt na entrada padrão,
+de modo que uma chamada só precisa escrever o prompt e ler a resposta.
+
+Limitação: versões recentes do Claude CLI em modo ``-p`` desistem de esperar
+pela entrada padrão após cerca de 3 segundos ("no stdin data received in
+3s") e saem com erro. Por isso um processo só é entregue enquanto for mais
+novo que ``idle_timeout`` (abaixo dessa janela), é descartado antes de
+expirar e o slot só volta a ser aquecido quando houver nova demanda: o pool
+ajuda em rajadas de chamadas, sem reiniciar processos sem parar enquanto a
+aplicação está ociosa. As chamadas que retomam uma sessão não se beneficiam
+dele, pois --resume depende do ID da sessão.
+"""
+
+import os
+import time
+import atexit
+import signal
+import logging
+import threading
+import subprocess
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Grupos de processos do Claude CLI ainda não finalizados (ver kill_process_group)
+_live_groups = set()
+_live_groups_lock = threading.Lock()
+
+
+def track_process_group(process: subprocess.Popen) -> None:
+    """
+    Registra o grupo de um processo iniciado com start_new_session=True, para
+    que o reaper o encerre caso a aplicação termine antes da chamada.
+    """
+    with _live_groups_lock:
+        _live_groups.add(process.pid)
+
+
+def kill_process_group(process: subprocess.Popen) -> None:
+    """
+    Encerra o processo e todos os filhos do seu grupo e recolhe o processo.
+
+    O Claude CLI pode iniciar subprocessos (ferramentas, shell); encerrar só
+    o processo principal deixaria esses filhos órfãos.
+
+    Args:
+        process (subprocess.Popen): Processo iniciado com start_new_session=True
+    """
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+    except Exception as e:
+        logger.debug(f"Erro ao encerrar grupo do processo {process.pid}: {str(e)}")
+
+    try:
+        process.wait(timeout=5)
+    except Exception as e:
+        logger.warning(f"Processo {process.pid} não terminou após SIGKILL: {str(e)}")
+
+    with _live_groups_lock:
+        _live_groups.discard(process.pid)
+
+
+def reap_process_groups() -> None:
+    """Encerra os grupos de processos que ainda estiverem registrados."""
+    with _live_groups_lock:
+        groups = list(_live_groups)
+        _live_groups.clear()
+
+    for pgid in groups:
+        try:
+            os.killpg(pgid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+atexit.register(reap_process_groups)
+
+
+def spawn_process(argv: Sequence[str]) -> subprocess.Popen:
+    """
+    Inicia um processo do Claude CLI em um grupo de processos próprio.
+
+    Args:
+        argv (Sequence[str]): Executável e argumentos
+
+    Returns:
+        subprocess.Popen: Processo aguardando o prompt na entrada padrão
+    """
+    process = subprocess.Popen(
+        list(argv),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True
+    )
+    track_process_group(process)
+    return process
+
+
+def _terminate(process: subprocess.Popen) -> None:
+    """Encerra um processo ocioso do pool sem propagar erros."""
+    try:
+        kill_process_group(process)
+    except Exception as e:
+        logger.debug(f"Erro ao encerrar processo do pool: {str(e)}")
+
+
+class ClaudeWorker:
+    """
+    Slot do pool que mantém um processo do Claude CLI pronto para uso.
+
+    No modo ``-p`` o Claude CLI atende um único prompt por processo, então o
+    slot entrega o processo aquecido a quem o solicitar e um novo é iniciado
+    em seguida. Os contadores acompanham o slot ao longo das reciclagens.
+    """
+
+    def __init__(self, worker_id: int, argv: Tuple[str, ...]):
+        self.worker_id = worker_id
+        self.argv = argv
+        self.process: Optional[subprocess.Popen] = None
+        self.spawned_at = 0.0
+        self.spawning = False
+        # Processo descartado sem uso: só reaquecer quando houver demanda
+        self.expired = False
+        self.requests = 0
+        self.recycles = 0
+        self.health_failures = 0
+
+    def is_healthy(self) -> bool:
+        """Verifica se o processo aquecido ainda está vivo."""
+        return self.process is not None and self.process.poll() is None
+
+    def idle_for(self) -> float:
+        """Tempo (em segundos) desde que o processo atual foi iniciado."""
+        return time.monotonic() - self.spawned_at
+
+    def take(self) -> subprocess.Popen:
+        """Entrega o processo aquecido e deixa o slot vazio."""
+        process, self.process = self.process, None
+        self.requests += 1
+        return process
+
+    def discard(self) -> None:
+        """Encerra o processo atual do slot, se houver."""
+        process, self.process = self.process, None
+        if process is not None:
+            _terminate(process)
+
+    def expire(self) -> None:
+        """Descarta o processo que ficou ocioso demais e deixa o slot frio."""
+        self.recycles += 1
+        self.expired = True
+        self.discard()
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna os contadores do slot."""
+        return {
+            "worker_id": self.worker_id,
+            "args": list(self.argv[1:]),
+            "ready": self.is_healthy(),
+            "requests": self.requests,
+            "recycles": self.recycles,
+            "health_failures": self.health_failures
+        }
+
+
+class ClaudeWorkerPool:
+    """
+    Mantém ``size`` processos aquecidos para cada conjunto de argumentos
+    informado em ``warm_args``.
+
+    Uma thread de manutenção repõe os processos consumidos, verifica se os
+    processos ociosos continuam vivos e descarta os que ficaram ociosos por
+    ``idle_timeout`` segundos, antes de o CLI desistir de esperar o prompt.
+    Um slot descartado sem uso só é reaquecido no próximo pedido. Pedidos
+    para argumentos sem processo aquecido disponível iniciam um processo na
+    hora (partida a frio).
+    """
+
+    def __init__(self, claude_path: str, size: int, idle_timeout: float,
+                 health_interval: float, warm_args: Sequence[Sequence[str]]):
+        self.claude_path = claude_path
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.health_interval = health_interval
+        self._workers: Dict[Tuple[str, ...], List[ClaudeWorker]] = {}
+        for args in warm_args:
+            argv = (claude_path, *args)
+            self._workers[argv] = [ClaudeWorker(i, argv) for i in range(size)]
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.warm_hits = 0
+        self.warm_failures = 0
+        self.cold_starts = 0
+
+    def start(self) -> None:
+        """Inicia a thread de manutenção, que aquece os processos."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._maintenance_loop,
+                                        name="claude-worker-pool", daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def acquire(self, args: Sequence[str]) -> subprocess.Popen:
+        """
+        Obtém um processo do Claude CLI para os argumentos informados.
+
+        Args:
+            args (Sequence[str]): Argumentos do Claude CLI (sem o executável)
+
+        Returns:
+            Tuple[subprocess.Popen, bool]: Processo aguardando o prompt na
+            entrada padrão e se ele veio aquecido do pool
+        """
+        argv = (self.claude_path, *args)
+        process = None
+
+        with self._lock:
+            for worker in self._workers.get(argv, []):
+                # Houve demanda: os slots frios voltam a ser aquecidos
+                worker.expired = False
+                if worker.process is None or process is not None:
+                    continue
+                if not worker.is_healthy():
+                    worker.health_failures += 1
+                    worker.discard()
+                    continue
+                if self.idle_timeout and worker.idle_for() >= self.idle_timeout:
+                    # Perto de o CLI desistir de esperar o prompt: não entregar
+                    worker.expire()
+                    worker.expired = False
+                    continue
+                process = worker.take()
+                self.warm_hits += 1
+
+            if process is None:
+                self.cold_starts += 1
+
+        # Pedir à thread de manutenção para repor o slot consumido
+        self._wake.set()
+
+        if process is None:
+            logger.debug(f"Nenhum processo aquecido disponível, iniciando a frio: {argv}")
+            return self.spawn_cold(argv), False
+
+        return process, True
+
+    def spawn_cold(self, argv: Sequence[str]) -> subprocess.Popen:
+        """
+        Inicia um processo na hora, fora do pool (partida a frio).
+
+        Usado também quando um processo aquecido encerrou antes de ler o prompt.
+
+        Args:
+            argv (Sequence[str]): Executável e argumentos
+
+        Returns:
+            subprocess.Popen: Processo aguardando o prompt na entrada padrão
+        """
+        return spawn_process(argv)
+
+    def record_warm_failure(self) -> None:
+        """Conta um processo aquecido que encerrou antes de ler o prompt."""
+        with self._lock:
+            self.warm_failures += 1
+            self.cold_starts += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Retorna estatísticas do pool.
+
+        Returns:
+            Dict: Contadores gerais e por slot
+        """
+        with self._lock:
+            return {
+                "size": self.size,
+                "warm_hits": self.warm_hits,
+                "warm_failures": self.warm_failures,
+                "cold_starts": self.cold_starts,
+                "workers": [worker.stats()
+                            for workers in self._workers.values()
+                            for worker in workers]
+            }
+
+    def shutdown(self) -> None:
+        """Para a manutenção e encerra todos os processos ociosos."""
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            for workers in self._workers.values():
+                for worker in workers:
+                    worker.discard()
+
+    def _maintenance_loop(self) -> None:
+        """Repõe, verifica e recicla os processos do pool."""
+        while not self._stop.is_set():
+            try:
+                self._check_workers()
+            except Exception:
+                logger.exception("Erro na manutenção do pool do Claude CLI")
+            self._wake.wait(self._next_check())
+            self._wake.clear()
+
+    def _next_check(self) -> float:
+        """Tempo até a próxima verificação: o intervalo ou o próximo processo a expirar."""
+        timeout = self.health_interval
+        if self.idle_timeout:
+            with self._lock:
+                for workers in self._workers.values():
+                    for worker in workers:
+                        if worker.process is not None:
+                            timeout = min(timeout, self.idle_timeout - worker.idle_for())
+        return max(timeout, 0.05)
+
+    def _check_workers(self) -> None:
+        """Executa um ciclo de verificação de saúde e reposição."""
+        to_spawn = []
+
+        with self._lock:
+            for workers in self._workers.values():
+                for worker in workers:
+                    if worker.spawning:
+                        continue
+                    if worker.process is not None:
+                        if not worker.is_healthy():
+                            worker.health_failures += 1
+                            logger.warning(f"Processo do pool encerrou inesperadamente (slot {worker.worker_id})")
+                            worker.discard()
+                        elif self.idle_timeout and worker.idle_for() >= self.idle_timeout:
+                            worker.expire()
+                    if worker.process is None and not worker.expired:
+                        worker.spawning = True
+                        to_spawn.append(worker)
+
+        # Iniciar os processos fora do lock para não bloquear acquire()
+        for worker in to_spawn:
+            if self._stop.is_set():
+                break
+            try:
+                process = spawn_process(worker.argv)
+            except Exception as e:
+                logger.error(f"Erro ao iniciar processo do pool: {str(e)}")
+                process = None
+            with self._lock:
+                worker.spawning = False
+                if process is not None and self._stop.is_set():
+                    _terminate(process)
+                elif process is not None:
+                    worker.process = process
+                    worker.spawned_at = time.monotonic()
+
+        with self._lock:
+            for worker in to_spawn:
+                worker.spawning = False